@@ -3,11 +3,16 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from dotenv import load_dotenv
+from .sharding import ShardRoutingSession, shard_binds
 
 # Global db instance
-_db = SQLAlchemy()
+_db = SQLAlchemy(session_options={"class_": ShardRoutingSession})
 
 def _build_db_uri() -> str:
+    if os.getenv("DB_BACKEND", "mysql") == "sqlite":
+        # Embedded database (see app/sqlite_backend.py); a relative path is under instance/
+        path = os.getenv("SQLITE_PATH", "parking_system.db")
+        return "sqlite://" if path == ":memory:" else f"sqlite:///{path}"
     user = os.getenv("DB_USER", "root")
     password = os.getenv("DB_PASSWORD", "")
     host = os.getenv("DB_HOST", "127.0.0.1")
@@ -16,6 +21,11 @@ def _build_db_uri() -> str:
     return f"mysql+pymysql://{user}:{password}@{host}:{port}/{name}"
 
 
+def _shard_uris() -> list:
+    # DB_SHARDS="uri0,uri1,...": one database per group of lots (see app/sharding.py)
+    return [u.strip() for u in os.getenv("DB_SHARDS", "").split(",") if u.strip()]
+
+
 def create_app() -> Flask:
     # Load .env if present
     load_dotenv()
@@ -23,12 +33,40 @@ def create_app() -> Flask:
     app = Flask(__name__, static_folder="static", template_folder="templates")
     CORS(app)
 
+    from .json_response import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev-secret")
-    app.config["SQLALCHEMY_DATABASE_URI"] = _build_db_uri()
+    shard_uris = _shard_uris()
+    app.config["SQLALCHEMY_DATABASE_URI"] = shard_uris[0] if shard_uris else _build_db_uri()
+    app.config["SQLALCHEMY_BINDS"] = shard_binds(shard_uris)
+    app.config["DB_SHARD_KEYS"] = list(app.config["SQLALCHEMY_BINDS"])
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config["API_COMPRESS_MIN_SIZE"] = int(os.getenv("API_COMPRESS_MIN_SIZE", "1024"))
+    # Overstay alerting: default maximum stay, plus optional per-lot overrides as 'LotID:hours,...'
+    app.config["ALERT_MAX_STAY_HOURS"] = float(os.getenv("ALERT_MAX_STAY_HOURS", "24"))
+    app.config["ALERT_LOT_MAX_STAY_HOURS"] = os.getenv("ALERT_LOT_MAX_STAY_HOURS", "")
+    # Confirm plate-index matches with one query per database (drops tickets closed by other workers)
+    app.config["PLATE_INDEX_VERIFY"] = os.getenv("PLATE_INDEX_VERIFY", "1") == "1"
+    # Seconds a rendered template fragment may be reused; 0 disables fragment caching
+    app.config["FRAGMENT_CACHE_TTL"] = float(os.getenv("FRAGMENT_CACHE_TTL", "300"))
+    # Rebuild fingerprinted static bundles at startup; disable where `flask assets` runs at deploy time
+    app.config["ASSETS_BUILD_ON_START"] = os.getenv("ASSETS_BUILD_ON_START", "1") == "1"
 
     _db.init_app(app)
 
+    from .sqlite_backend import init_sqlite_backend
+    init_sqlite_backend(app)
+
+    from .plate_index import init_plate_index
+    from .alerts import init_alert_engine
+    from .fragment_cache import init_fragment_cache
+    from .assets import init_assets
+    init_plate_index(app)
+    init_alert_engine(app)
+    init_fragment_cache(app)
+    init_assets(app)
+
     # Ensure DB triggers/procs/functions are present. This will execute PROJECT/init_db.sql
     try:
         from .db_init import run_init_sql
@@ -39,11 +77,27 @@ def create_app() -> Flask:
         # Log but do not stop app creation; initialization errors can be investigated separately
         app.logger.exception("Failed to run DB init SQL: %s", e)
 
+    # Load the plate index now rather than on the first lookup; if this fails it loads on first use
+    try:
+        from .plate_index import get_plate_index
+
+        with app.app_context():
+            get_plate_index()
+    except Exception as e:
+        app.logger.exception("Failed to load plate index: %s", e)
+
     # Register blueprints
     from .routes import main_bp, api_bp
     app.register_blueprint(main_bp)
     app.register_blueprint(api_bp, url_prefix="/api")
 
+    from .audit import audit_command
+    from .settlement import settle_command
+    from .sqlite_backend import parity_command
+    app.cli.add_command(audit_command)
+    app.cli.add_command(settle_command)
+    app.cli.add_command(parity_command)
+
     return app
 
 # convenient import alias
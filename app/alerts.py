@@ -0,0 +1,309 @@
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import text
+from . import db
+from .sharding import scatter, scatter_rows
+
+_OPEN_TICKETS_SQL = (
+    "SELECT t.TicketID, t.LicensePlate, t.EntryTime, r.GracePerMinute, s.LotID "
+    "FROM ParkingTicket t "
+    "LEFT JOIN ParkingRate r ON r.RateID = t.RateID "
+    "LEFT JOIN ParkingSpot s ON s.SpotID = t.SpotID "
+    "WHERE t.ExitTime IS NULL"
+)
+
+# Alerted tickets that are still open, by primary key
+_STILL_OPEN_SQL = "SELECT TicketID FROM ParkingTicket WHERE ExitTime IS NULL AND TicketID IN ({ids})"
+
+# Exited tickets with money still owed (uses idx_ticket_status_exit)
+_OUTSTANDING_SQL = (
+    "SELECT t.TicketID, t.LicensePlate, t.EntryTime, t.ExitTime, t.TotalFee, "
+    "COALESCE(SUM(CASE WHEN p.TransactionStatus = 'Success' THEN p.Amount ELSE 0 END), 0) AS Paid "
+    "FROM ParkingTicket t "
+    "LEFT JOIN Payment p ON p.TicketID = t.TicketID "
+    "WHERE t.PaymentStatus IN ('Unpaid', 'Partial') AND t.ExitTime IS NOT NULL "
+    "GROUP BY t.TicketID, t.LicensePlate, t.EntryTime, t.ExitTime, t.TotalFee "
+    "ORDER BY t.ExitTime, t.TicketID"
+)
+
+DEFAULT_GRACE_MINUTES = 15  # ParkingRate.GracePerMinute server default
+
+
+def parse_lot_max_stay(raw: str):
+    """Parse ALERT_LOT_MAX_STAY_HOURS, e.g. '2:4,3:12' -> {2: 4.0, 3: 12.0}."""
+    result = {}
+    for part in (raw or "").split(","):
+        if ":" in part:
+            lot_id, hours = part.split(":", 1)
+            result[int(lot_id)] = float(hours)
+    return result
+
+
+class AlertEngine:
+    """Schedules grace-expiry and overstay deadlines of open tickets in a min-heap.
+
+    Open tickets are loaded once; afterwards entry/exit/swap events push or
+    invalidate heap entries in O(log n). Entries are invalidated lazily: each
+    ticket carries a generation number and stale heap items are skipped when
+    popped. A daemon thread sleeps until the earliest deadline and moves due
+    items into the active alert set, so nothing ever rescans all tickets.
+    """
+
+    def __init__(self, max_stay_hours: float = 24, lot_max_stay_hours=None, logger=None):
+        self.max_stay_hours = max_stay_hours
+        self.lot_max_stay_hours = lot_max_stay_hours or {}
+        self.logger = logger
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self._tickets = {}  # TicketID -> (generation, plate, deadlines, entry_time)
+        self._active = {}  # (TicketID, kind) -> alert dict
+        self._loaded = False
+        self._load_lock = threading.Lock()
+        self._pending = None  # track/untrack calls seen while a load's SELECT runs
+        self._thread = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @property
+    def tracking(self) -> bool:
+        """True once ticket events need to reach the engine (loaded, or loading)."""
+        return self._loaded or self._pending is not None
+
+    def load(self, rows) -> None:
+        """(Re)build the schedule from rows of _OPEN_TICKETS_SQL.
+
+        track/untrack calls recorded since ensure_started() began its query are
+        replayed on top, so tickets opened or closed meanwhile are not lost.
+        """
+        with self._cond:
+            self._heap.clear()
+            self._tickets.clear()
+            self._active.clear()
+            for row in rows:
+                self._schedule(*row)
+            heapq.heapify(self._heap)
+            for event in self._pending or ():
+                event()
+            self._pending = None
+            self._loaded = True
+            self._cond.notify()
+        # Tickets already past a deadline at load time are a backlog, not fresh events
+        self.advance(log=False)
+
+    def _deadlines(self, entry_time, grace_minutes, lot_id):
+        grace = DEFAULT_GRACE_MINUTES if grace_minutes is None else grace_minutes
+        max_stay = self.lot_max_stay_hours.get(lot_id, self.max_stay_hours)
+        yield "grace_expired", entry_time + timedelta(minutes=grace)
+        if max_stay:
+            yield "overstay", entry_time + timedelta(hours=max_stay)
+
+    def _schedule(self, ticket_id, plate, entry_time, grace_minutes, lot_id, push=False):
+        if isinstance(entry_time, str):
+            entry_time = datetime.fromisoformat(entry_time)
+        deadlines = tuple(self._deadlines(entry_time, grace_minutes, lot_id))
+        previous = self._tickets.get(ticket_id)
+        if previous is not None and previous[1:3] == (plate, deadlines):
+            # e.g. a swap within the same lot: nothing to reschedule
+            return
+        generation = previous[0] + 1 if previous else 1
+        self._tickets[ticket_id] = (generation, plate, deadlines, entry_time)
+        self._active.pop((ticket_id, "grace_expired"), None)
+        self._active.pop((ticket_id, "overstay"), None)
+        for kind, deadline in deadlines:
+            item = (deadline, next(self._seq), ticket_id, generation, kind)
+            if push:
+                heapq.heappush(self._heap, item)
+            else:
+                self._heap.append(item)
+
+    def track(self, ticket_id, plate, entry_time, grace_minutes, lot_id) -> None:
+        """(Re)schedule an open ticket after entry, swap or edit."""
+        with self._cond:
+            self._record(lambda: self._schedule(ticket_id, plate, entry_time, grace_minutes, lot_id, push=True))
+            self._cond.notify()
+
+    def untrack(self, ticket_id) -> None:
+        """Drop a ticket on exit or delete; its heap entries become stale."""
+        def event():
+            self._tickets.pop(ticket_id, None)
+            self._active.pop((ticket_id, "grace_expired"), None)
+            self._active.pop((ticket_id, "overstay"), None)
+
+        with self._cond:
+            self._record(event)
+
+    def _record(self, event) -> None:
+        # Caller holds self._cond
+        if self._pending is not None:
+            self._pending.append(event)
+        event()
+
+    def advance(self, now=None, log: bool = True):
+        """Pop every deadline up to now into the active set; return new alerts."""
+        now = now or datetime.now()
+        fired = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, ticket_id, generation, kind = heapq.heappop(self._heap)
+                current = self._tickets.get(ticket_id)
+                if current is None or current[0] != generation:
+                    continue
+                alert = {"ticketId": ticket_id, "licensePlate": current[1], "entryTime": current[3],
+                         "kind": kind, "since": deadline}
+                self._active[(ticket_id, kind)] = alert
+                fired.append(alert)
+        if log and self.logger is not None:
+            for alert in fired:
+                self.logger.warning("Ticket #%s (%s): %s since %s", alert["ticketId"], alert["licensePlate"], alert["kind"], alert["since"])
+        return fired
+
+    def active(self, limit: int = None, kind: str = None):
+        """Current alerts, longest-standing first."""
+        self.advance()
+        with self._cond:
+            alerts = [a for a in self._active.values() if kind is None or a["kind"] == kind]
+        if limit is not None:
+            return heapq.nsmallest(limit, alerts, key=lambda a: (a["since"], a["ticketId"]))
+        return sorted(alerts, key=lambda a: (a["since"], a["ticketId"]))
+
+    def _run(self) -> None:
+        while True:
+            self.advance()
+            with self._cond:
+                timeout = None
+                if self._heap:
+                    timeout = max((self._heap[0][0] - datetime.now()).total_seconds(), 0.0)
+                self._cond.wait(timeout)
+
+    def start(self) -> None:
+        with self._load_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="alert-engine", daemon=True)
+                self._thread.start()
+
+    def ensure_started(self, fetch_rows) -> None:
+        """Load open tickets from fetch_rows() and start the thread, once.
+
+        Only one thread runs the query; events arriving meanwhile are buffered
+        and replayed by load().
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            with self._cond:
+                self._pending = []
+            try:
+                rows = fetch_rows()
+            except Exception:
+                with self._cond:
+                    self._pending = None
+                raise
+            self.load(rows)
+        self.start()
+
+
+def current_alert_engine() -> AlertEngine:
+    """Return the app's AlertEngine as-is, for write paths that only keep it in sync."""
+    return current_app.extensions["alert_engine"]
+
+
+def get_alert_engine() -> AlertEngine:
+    """Return the app's AlertEngine, loading open tickets and starting it on first use."""
+    engine = current_alert_engine()
+    engine.ensure_started(lambda: scatter_rows(_OPEN_TICKETS_SQL))
+    return engine
+
+
+def track_ticket(ticket_id: int) -> None:
+    """Reload one ticket by primary key and reschedule (or drop) its deadlines."""
+    engine = current_alert_engine()
+    if not engine.tracking:
+        return
+    row = db.session.execute(text(_OPEN_TICKETS_SQL + " AND t.TicketID = :tid"), {"tid": ticket_id}).first()
+    if row is None:
+        engine.untrack(ticket_id)
+    else:
+        engine.track(*row)
+
+
+def retrack_tickets(where: str, params) -> None:
+    """Reschedule every open ticket matching where, e.g. after its rate or spot was edited."""
+    engine = current_alert_engine()
+    if not engine.tracking:
+        return
+    for row in db.session.execute(text(f"{_OPEN_TICKETS_SQL} AND {where}"), params):
+        engine.track(*row)
+
+
+def active_alerts(limit: int = None, kind: str = None):
+    """get_alert_engine().active(), with the alerted tickets re-checked by primary key.
+
+    The engine only hears about exits made by this process. One query per
+    database drops tickets closed by another worker or by plain SQL.
+    """
+    engine = get_alert_engine()
+    while True:
+        alerts = engine.active(limit=limit, kind=kind)
+        ids = sorted({a["ticketId"] for a in alerts})
+        if not ids:
+            return alerts
+        params = {f"id{i}": tid for i, tid in enumerate(ids)}
+        sql = _STILL_OPEN_SQL.format(ids=", ".join(f":{name}" for name in params))
+        closed = set(ids) - {int(row[0]) for row in scatter_rows(sql, params)}
+        if not closed:
+            return alerts
+        for ticket_id in closed:
+            engine.untrack(ticket_id)
+        if limit is None:
+            return [a for a in alerts if a["ticketId"] not in closed]
+        # Refill up to limit from the remaining alerts
+
+
+def _as_datetime(value):
+    # SQLite hands DATETIME back as text through text() queries
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def shard_outstanding_alerts(limit: int = None):
+    """'outstanding' alerts of the current database: exited tickets still Unpaid or Partial.
+
+    These have no deadline to schedule, so unlike grace/overstay alerts they
+    are queried on demand.
+    """
+    sql = _OUTSTANDING_SQL + (" LIMIT :limit" if limit is not None else "")
+    rows = db.session.execute(text(sql), {"limit": limit}).all()
+    alerts = []
+    for ticket_id, plate, entry_time, exit_time, fee, paid in rows:
+        balance = Decimal(str(fee or 0)) - Decimal(str(paid or 0))
+        alerts.append({"ticketId": ticket_id, "licensePlate": plate, "entryTime": _as_datetime(entry_time),
+                       "kind": "outstanding", "since": _as_datetime(exit_time),
+                       "balance": max(balance, Decimal(0)).quantize(Decimal("0.01"))})
+    return alerts
+
+
+def merge_alerts(parts, limit: int = None):
+    """Merge alert lists (e.g. one per shard), longest-standing first."""
+    alerts = sorted((a for part in parts for a in part), key=lambda a: (a["since"], a["ticketId"]))
+    return alerts[:limit] if limit is not None else alerts
+
+
+def outstanding_alerts(limit: int = None):
+    """shard_outstanding_alerts() of every shard, merged."""
+    return merge_alerts(scatter(shard_outstanding_alerts, limit), limit)
+
+
+def init_alert_engine(app) -> None:
+    app.extensions["alert_engine"] = AlertEngine(
+        max_stay_hours=app.config["ALERT_MAX_STAY_HOURS"],
+        lot_max_stay_hours=parse_lot_max_stay(app.config["ALERT_LOT_MAX_STAY_HOURS"]),
+        logger=app.logger,
+    )
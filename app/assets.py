@@ -0,0 +1,212 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+import click
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bundle name -> source files under app/static, concatenated in order
+BUNDLES = {
+    "app.css": ["css/style.css", "css/responsive.css"],
+    "app.js": ["js/main.js"],
+}
+
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+assets_bp = Blueprint("assets", __name__)
+
+_IDENT = re.compile(r"[A-Za-z0-9_$]")
+# Characters after which a '/' starts a regex literal rather than a division
+_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^") | {""}
+
+
+def minify_css(src: str) -> str:
+    src = re.sub(r"/\*.*?\*/", "", src, flags=re.S)
+    src = re.sub(r"\s+", " ", src)
+    # Not around ':' on its left or '+'/'-', which are significant in selectors and calc()
+    src = re.sub(r"\s*([{};,>])\s*", r"\1", src)
+    src = re.sub(r":\s+", ":", src)
+    return src.replace(";}", "}").strip()
+
+
+def minify_js(src: str) -> str:
+    """Strip comments and redundant whitespace.
+
+    Strings, template literals and regex literals are copied verbatim.
+    Newlines are kept (collapsed) so automatic semicolon insertion behaves
+    exactly as in the source.
+    """
+    out = []
+    i, n = 0, len(src)
+
+    def last_significant():
+        for chunk in reversed(out):
+            stripped = chunk.rstrip()
+            if stripped:
+                return stripped[-1]
+        return ""
+
+    while i < n:
+        ch = src[i]
+        nxt = src[i + 1] if i + 1 < n else ""
+        if ch in "'\"`":
+            j = i + 1
+            while j < n and src[j] != ch:
+                j += 2 if src[j] == "\\" else 1
+            out.append(src[i:j + 1])
+            i = j + 1
+        elif ch == "/" and nxt == "/":
+            while i < n and src[i] != "\n":
+                i += 1
+        elif ch == "/" and nxt == "*":
+            end = src.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            out.append(" ")
+        elif ch == "/" and last_significant() in _REGEX_PRECEDERS:
+            j, in_class = i + 1, False
+            while j < n and (in_class or src[j] != "/"):
+                if src[j] == "\\":
+                    j += 1
+                elif src[j] == "[":
+                    in_class = True
+                elif src[j] == "]":
+                    in_class = False
+                j += 1
+            j += 1
+            while j < n and src[j].isalpha():  # flags
+                j += 1
+            out.append(src[i:j])
+            i = j
+        elif ch.isspace():
+            j = i
+            while j < n and src[j].isspace():
+                j += 1
+            prev = out[-1][-1] if out and out[-1] else ""
+            following = src[j] if j < n else ""
+            if "\n" in src[i:j]:
+                if prev and prev != "\n":
+                    out.append("\n")
+            elif (_IDENT.match(prev or " ") and _IDENT.match(following or " ")) or (prev == following and prev in "+-") or "/" in (prev, following):
+                out.append(" ")
+            i = j
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out).strip() + "\n"
+
+
+def _static_path(app) -> Path:
+    return Path(app.static_folder)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Write a temp file next to path and rename it into place, so concurrent
+    # builders and readers never see a partly written file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def build_assets(app) -> dict:
+    """Bundle, minify, fingerprint and precompress BUNDLES into static/dist.
+
+    Writes a manifest mapping bundle name -> path relative to static and
+    returns it. Unchanged bundles are not rewritten. Every file is replaced
+    atomically and the .gz/.br variants land before the bundle itself, so
+    once a bundle exists its precompressed copies are complete too.
+    """
+    static = _static_path(app)
+    dist = static / DIST_DIR
+    dist.mkdir(exist_ok=True)
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        src = "\n".join((static / s).read_text(encoding="utf-8") for s in sources)
+        body = (minify_css(src) if name.endswith(".css") else minify_js(src)).encode("utf-8")
+        stem, ext = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}"
+        target = dist / filename
+        if not target.exists():
+            _write_atomic(dist / (filename + ".gz"), gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(dist / (filename + ".br"), brotli.compress(body, quality=11))
+            _write_atomic(target, body)
+        manifest[name] = f"{DIST_DIR}/{filename}"
+    _write_atomic(dist / MANIFEST, json.dumps(manifest, indent=2).encode("utf-8"))
+    return manifest
+
+
+def load_manifest(app) -> dict:
+    path = _static_path(app) / DIST_DIR / MANIFEST
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def asset_urls(name: str):
+    """URLs to include for a bundle: the fingerprinted file, or its sources if not built."""
+    manifest = current_app.extensions.get("assets_manifest") or {}
+    if name in manifest:
+        return [url_for("assets.dist", filename=manifest[name][len(DIST_DIR) + 1:])]
+    return [url_for("static", filename=s) for s in BUNDLES[name]]
+
+
+@assets_bp.route("/static/dist/<path:filename>")
+def dist(filename: str):
+    """Serve fingerprinted assets, precompressed when the client allows it."""
+    directory = _static_path(current_app) / DIST_DIR
+    encoding = None
+    accepted = request.accept_encodings
+    if accepted["br"] and (directory / (filename + ".br")).exists():
+        encoding = "br"
+    elif accepted["gzip"] and (directory / (filename + ".gz")).exists():
+        encoding = "gzip"
+    suffix = {"br": ".br", "gzip": ".gz"}.get(encoding, "")
+    response = send_from_directory(directory, filename + suffix, max_age=IMMUTABLE_MAX_AGE, conditional=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+        response.mimetype = "text/css" if filename.endswith(".css") else "text/javascript"
+    response.vary.add("Accept-Encoding")
+    # The name changes whenever the content does, so clients never need to revalidate
+    response.cache_control.immutable = True
+    response.cache_control.public = True
+    return response
+
+
+@click.command("assets")
+@with_appcontext
+def assets_command():
+    """Build fingerprinted, minified and precompressed static bundles."""
+    manifest = build_assets(current_app)
+    current_app.extensions["assets_manifest"] = manifest
+    for name, path in manifest.items():
+        click.echo(f"{name} -> {path}")
+
+
+def init_assets(app) -> None:
+    manifest = {}
+    if app.config["ASSETS_BUILD_ON_START"]:
+        try:
+            manifest = build_assets(app)
+        except OSError as e:
+            # e.g. read-only static folder: fall back to a previously built manifest or the source files
+            app.logger.warning("Could not build static assets: %s", e)
+    app.extensions["assets_manifest"] = manifest or load_manifest(app)
+    app.register_blueprint(assets_bp)
+    app.add_template_global(asset_urls, "asset_urls")
+    app.cli.add_command(assets_command)
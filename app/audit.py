@@ -0,0 +1,196 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import Numeric, bindparam, create_engine, event, text
+from . import db
+from .fragment_cache import bump
+from .sqlite_backend import ticket_fee
+
+# Invariants normally maintained by the triggers in init_db.sql / project.sql,
+# which edit_ticket, edit_spot and delete_payment bypass:
+#   spot_occupancy  ParkingSpot.IsOccupied  <=> an open ticket (ExitTime IS NULL) uses the spot
+#   payment_status  ParkingTicket.PaymentStatus agrees with SUM(successful Payment.Amount);
+#                   like trg_after_payment_success, only once TotalFee is set, and a ticket
+#                   with no successful payment keeps its initial 'Unpaid'
+#   total_fee       ParkingTicket.TotalFee = CEILING(TIMESTAMPDIFF(MINUTE, ...) / 60) * RatePerHour
+#                   for exited tickets
+
+_SPOT_CHUNK_SQL = text(
+    "SELECT s.SpotID, s.IsOccupied, "
+    "EXISTS (SELECT 1 FROM ParkingTicket t WHERE t.SpotID = s.SpotID AND t.ExitTime IS NULL) AS HasOpenTicket "
+    "FROM ParkingSpot s WHERE s.SpotID BETWEEN :lo AND :hi"
+)
+
+_TICKET_CHUNK_SQL = text(
+    "SELECT t.TicketID, t.EntryTime, t.ExitTime, t.PaymentStatus, t.TotalFee, r.RatePerHour, "
+    "COALESCE(SUM(CASE WHEN p.TransactionStatus = 'Success' THEN p.Amount ELSE 0 END), 0) AS Paid, "
+    "COUNT(CASE WHEN p.TransactionStatus = 'Success' THEN 1 END) AS Payments "
+    "FROM ParkingTicket t "
+    "LEFT JOIN ParkingRate r ON r.RateID = t.RateID "
+    "LEFT JOIN Payment p ON p.TicketID = t.TicketID "
+    "WHERE t.TicketID BETWEEN :lo AND :hi "
+    "GROUP BY t.TicketID, t.EntryTime, t.ExitTime, t.PaymentStatus, t.TotalFee, r.RatePerHour"
+)
+
+_TABLES = {
+    "ParkingSpot": ("SpotID", _SPOT_CHUNK_SQL),
+    "ParkingTicket": ("TicketID", _TICKET_CHUNK_SQL),
+}
+
+_CENT = Decimal("0.01")
+
+_worker_engine = None
+
+
+def _read_only_engine(uri: str):
+    """Engine for audit reads: READ COMMITTED consistent reads take no row locks on InnoDB."""
+    if uri.startswith("mysql"):
+        engine = create_engine(uri, isolation_level="READ COMMITTED", pool_size=1)
+
+        @event.listens_for(engine, "connect")
+        def _set_read_only(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            cur.execute("SET SESSION TRANSACTION READ ONLY")
+            cur.close()
+
+        return engine
+    return create_engine(uri)
+
+
+def _init_worker(uri: str) -> None:
+    global _worker_engine
+    _worker_engine = _read_only_engine(uri)
+
+
+def expected_fee(entry_time, exit_time, rate_per_hour):
+    """Mirror trg_before_ticket_exit, using the embedded backend's emulation of it.
+
+    TIMESTAMPDIFF truncates toward zero, so an ExitTime before EntryTime gives
+    a fee of CEILING(negative hours), not the floored minute count.
+    """
+    return Decimal(str(ticket_fee(entry_time, exit_time, rate_per_hour))).quantize(_CENT)
+
+
+def expected_status(total_fee, paid, payments=1):
+    """Mirror trg_after_payment_success; None while TotalFee is NULL (status left alone).
+
+    The trigger only runs on a successful payment, so a ticket with none stays
+    'Unpaid' even when its fee is 0.
+    """
+    if total_fee is None:
+        return None
+    if payments and paid >= total_fee:
+        return "Paid"
+    if paid > 0:
+        return "Partial"
+    return "Unpaid"
+
+
+def _check_spots(rows):
+    for spot_id, is_occupied, has_open in rows:
+        if bool(is_occupied) != bool(has_open):
+            yield {"check": "spot_occupancy", "table": "ParkingSpot", "id": spot_id,
+                   "actual": bool(is_occupied), "expected": bool(has_open)}
+
+
+def _check_tickets(rows):
+    for ticket_id, entry, exit_, status, fee, rate, paid, payments in rows:
+        paid = Decimal(str(paid))
+        # DECIMAL(10,2); SQLite may hand back 1 or 1.0
+        fee = Decimal(str(fee)).quantize(_CENT) if fee is not None else None
+        if exit_ is not None and entry is not None and rate is not None:
+            want_fee = expected_fee(entry, exit_, rate)
+            if fee is None or fee != want_fee:
+                yield {"check": "total_fee", "table": "ParkingTicket", "id": ticket_id,
+                       "actual": fee, "expected": want_fee}
+            fee = want_fee
+        want_status = expected_status(fee, paid, payments)
+        if want_status is not None and status != want_status:
+            yield {"check": "payment_status", "table": "ParkingTicket", "id": ticket_id,
+                   "actual": status, "expected": want_status}
+
+
+def audit_chunk(table: str, lo: int, hi: int, engine=None):
+    """Check one PK range of table and return its violations."""
+    _, sql = _TABLES[table]
+    with (engine or _worker_engine).connect() as conn:
+        rows = conn.execute(sql, {"lo": lo, "hi": hi}).all()
+    check = _check_spots if table == "ParkingSpot" else _check_tickets
+    return list(check(rows))
+
+
+def chunk_ranges(conn, table: str, chunk_size: int):
+    """Split table's PK span into inclusive [lo, hi] ranges of chunk_size ids."""
+    pk, _ = _TABLES[table]
+    lo, hi = conn.execute(text(f"SELECT MIN({pk}), MAX({pk}) FROM {table}")).one()
+    if lo is None:
+        return []
+    return [(start, min(start + chunk_size - 1, hi)) for start in range(lo, hi + 1, chunk_size)]
+
+
+def run_audit(uri: str, workers: int = 4, chunk_size: int = 50000):
+    """Yield violations for every table, checking PK chunks in a process pool.
+
+    With workers <= 1 chunks are checked in-process, which also lets the
+    audit run against in-memory SQLite databases.
+    """
+    engine = _read_only_engine(uri)
+    with engine.connect() as conn:
+        jobs = [(table, lo, hi) for table in _TABLES for lo, hi in chunk_ranges(conn, table, chunk_size)]
+    if workers <= 1:
+        for job in jobs:
+            yield from audit_chunk(*job, engine=engine)
+        return
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(uri,)) as pool:
+        futures = [pool.submit(audit_chunk, *job) for job in jobs]
+        for future in as_completed(futures):
+            yield from future.result()
+
+
+_REPAIR_SQL = {
+    "spot_occupancy": text("UPDATE ParkingSpot SET IsOccupied = :expected WHERE SpotID = :id AND IsOccupied = :actual"),
+    "total_fee": text(
+        "UPDATE ParkingTicket SET TotalFee = :expected WHERE TicketID = :id AND ExitTime IS NOT NULL "
+        "AND (TotalFee = :actual OR (TotalFee IS NULL AND :actual IS NULL))"
+    ).bindparams(bindparam("expected", type_=Numeric(10, 2)), bindparam("actual", type_=Numeric(10, 2))),
+    "payment_status": text("UPDATE ParkingTicket SET PaymentStatus = :expected WHERE TicketID = :id AND PaymentStatus = :actual"),
+}
+
+
+def repair(conn, violation) -> int:
+    """Apply the fix for one violation, guarded on the value the audit saw."""
+    return conn.execute(_REPAIR_SQL[violation["check"]], violation).rowcount
+
+
+@click.command("audit")
+@click.option("--workers", default=4, show_default=True, help="Worker processes (<= 1 runs in-process).")
+@click.option("--chunk-size", default=50000, show_default=True, help="Primary keys per chunk.")
+@click.option("--repair", "do_repair", is_flag=True, help="Fix violations after reporting them.")
+@with_appcontext
+def audit_command(workers: int, chunk_size: int, do_repair: bool):
+    """Check occupancy, payment-status and fee invariants across the database."""
+    # Every shard is audited (and repaired) independently
+    for key in current_app.config["DB_SHARD_KEYS"] or [None]:
+        # The engine's URL, since Flask-SQLAlchemy resolves relative SQLite paths under instance/
+        uri = db.engines[key].url.render_as_string(hide_password=False)
+        if key is not None:
+            click.echo(f"== {key} ==")
+        violations = []
+        for v in run_audit(uri, workers=workers, chunk_size=chunk_size):
+            click.echo(f"{v['check']}: {v['table']} #{v['id']} is {v['actual']!r}, expected {v['expected']!r}")
+            violations.append(v)
+        click.echo(f"{len(violations)} violation(s) found")
+        if not do_repair or not violations:
+            continue
+        # Fees first: the expected PaymentStatus was computed from the corrected fee
+        violations.sort(key=lambda v: v["check"] != "total_fee")
+        fixed = 0
+        for v in violations:
+            # One short transaction per row so live traffic is never blocked behind the repair
+            with db.engines[key].begin() as conn:
+                fixed += repair(conn, v)
+        click.echo(f"{fixed} row(s) repaired")
+        if fixed:
+            bump("spots", "tickets")
@@ -1,28 +1,98 @@
+from contextlib import contextmanager
 from datetime import datetime
 from sqlalchemy import text
-from . import db
+from . import sqlite_backend
+from .sharding import shard_engine
 
+# Each helper runs one stored function/procedure from init_db.sql / project.sql.
+# On the embedded SQLite backend the Python versions in sqlite_backend run
+# instead. Pass conn (e.g. db.session.connection()) to run inside an existing
+# transaction; otherwise a transaction on the current shard is used.
 
-def create_parking_lot_with_default_rates(lot_name: str, capacity: int, location: str = None, levels: int = 1):
+
+@contextmanager
+def _connection(conn=None):
+    if conn is not None:
+        yield conn
+        return
+    with shard_engine().begin() as conn:
+        yield conn
+
+
+def create_parking_lot_with_default_rates(lot_name: str, capacity: int, location: str = None, levels: int = 1, conn=None):
     """Call stored procedure sp_CreateNewParkingLotWithDefaultRates.
 
-    Uses a transactional engine connection. Raises any exception that occurs.
+    Raises any exception that occurs. Returns the new LotID.
     """
     params = {"p_LotName": lot_name, "p_Capacity": capacity, "p_Location": location, "p_Levels": levels}
     call = text("CALL sp_CreateNewParkingLotWithDefaultRates(:p_LotName, :p_Capacity, :p_Location, :p_Levels)")
-    with db.engine.begin() as conn:
+    with _connection(conn) as conn:
+        if sqlite_backend.is_sqlite(conn):
+            return sqlite_backend.sp_CreateNewParkingLotWithDefaultRates(conn, lot_name, capacity, location, levels)
         conn.execute(call, params)
+        # LAST_INSERT_ID() now refers to the rates; LotName is unique
+        return conn.execute(text("SELECT LotID FROM ParkingLot WHERE LotName = :name"), {"name": lot_name}).scalar()
 
 
-def add_new_ticket_and_occupy_spot(license_plate: str, spot_id: int, rate_id: int, entry_time: str = None):
+def add_new_ticket_and_occupy_spot(license_plate: str, spot_id: int, rate_id: int, entry_time: str = None, conn=None):
     """Call stored procedure sp_AddNewTicketAndOccupySpot.
 
     entry_time may be a datetime or a string 'YYYY-MM-DD HH:MM:SS'. If None, NOW() will be used by caller (pass current time).
+    Returns the new TicketID (LAST_INSERT_ID() of the procedure's session).
     """
     if entry_time is None:
         entry_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
     params = {"p_LicensePlate": license_plate, "p_SpotID": spot_id, "p_RateID": rate_id, "p_EntryTime": entry_time}
     call = text("CALL sp_AddNewTicketAndOccupySpot(:p_LicensePlate, :p_SpotID, :p_RateID, :p_EntryTime)")
-    with db.engine.begin() as conn:
+    with _connection(conn) as conn:
+        if sqlite_backend.is_sqlite(conn):
+            return sqlite_backend.sp_AddNewTicketAndOccupySpot(conn, license_plate, spot_id, rate_id, entry_time)
         conn.execute(call, params)
+        ticket_id = conn.execute(text("SELECT LAST_INSERT_ID()")).scalar()
+    return int(ticket_id) if ticket_id else None
+
+
+def swap_parking_spots(ticket_id: int, new_spot_number: str, conn=None) -> None:
+    """Call stored procedure sp_SwapParkingSpots (move a ticket to another spot of its lot)."""
+    with _connection(conn) as conn:
+        if sqlite_backend.is_sqlite(conn):
+            sqlite_backend.sp_SwapParkingSpots(conn, ticket_id, new_spot_number)
+            return
+        conn.execute(text("CALL sp_SwapParkingSpots(:tid, :spot)"), {"tid": ticket_id, "spot": new_spot_number})
+
+
+def process_vehicle_exit(ticket_id: int, amount, method: str, staff_id: int = None, conn=None):
+    """Call stored procedure sp_ProcessVehicleExit and return the new PaymentID.
+
+    The procedure takes no staff id; when staff_id is given the Payment row it
+    inserted is attributed afterwards.
+    """
+    with _connection(conn) as conn:
+        if sqlite_backend.is_sqlite(conn):
+            payment_id = sqlite_backend.sp_ProcessVehicleExit(conn, ticket_id, amount, method)
+        else:
+            conn.execute(text("CALL sp_ProcessVehicleExit(:tid, :amt, :pm)"), {"tid": ticket_id, "amt": amount, "pm": method})
+            payment_id = conn.execute(text("SELECT LAST_INSERT_ID()")).scalar()
+        if staff_id:
+            conn.execute(
+                text("UPDATE Payment SET StaffID = :sid WHERE PaymentID = :pid AND TicketID = :tid"),
+                {"sid": staff_id, "pid": payment_id, "tid": ticket_id},
+            )
+    return payment_id
+
+
+def available_spots_count(lot_id: int, conn=None) -> int:
+    """Call stored function fn_GetAvailableSpotsCount."""
+    with _connection(conn) as conn:
+        if sqlite_backend.is_sqlite(conn):
+            return sqlite_backend.fn_GetAvailableSpotsCount(conn, lot_id)
+        return conn.execute(text("SELECT fn_GetAvailableSpotsCount(:lot_id)"), {"lot_id": lot_id}).scalar()
+
+
+def driver_total_spent(driver_id: int, conn=None):
+    """Call stored function fn_GetDriverTotalSpent (sum of the driver's paid tickets)."""
+    with _connection(conn) as conn:
+        if sqlite_backend.is_sqlite(conn):
+            return sqlite_backend.fn_GetDriverTotalSpent(conn, driver_id)
+        return conn.execute(text("SELECT fn_GetDriverTotalSpent(:driver_id)"), {"driver_id": driver_id}).scalar()
@@ -1,16 +1,25 @@
 import os
 from pathlib import Path
 from sqlalchemy import text
-from . import db
+from .sharding import all_engines
+
+# Everything init_db.sql creates; a database missing any of them gets the whole file again
+_TRIGGERS = ("trg_after_ticket_insert", "trg_before_ticket_exit", "trg_after_payment_success", "trg_after_ticket_delete")
+_ROUTINES = (
+    "fn_GetDriverTotalSpent", "fn_GetAvailableSpotsCount", "sp_CreateNewParkingLotWithDefaultRates",
+    "sp_AddNewTicketAndOccupySpot", "sp_SwapParkingSpots", "sp_ProcessVehicleExit",
+)
 
 
 def run_init_sql(app):
-    """Run PROJECT/init_db.sql once if key trigger is not present.
+    """Run PROJECT/init_db.sql once per database if any of its objects is missing.
 
-    This function checks information_schema for a known trigger. If missing,
-    it reads init_db.sql and splits the file by the sentinel
-    '-- STATEMENT_BOUNDARY' and executes each block with a transactional
-    connection. Designed to be idempotent (SQL contains DROP IF EXISTS).
+    This function checks information_schema for the triggers and routines
+    the file creates. If one is missing, it reads init_db.sql, splits the file
+    by the sentinel '-- STATEMENT_BOUNDARY' and executes each block with a
+    transactional connection. Designed to be idempotent (SQL contains DROP IF EXISTS).
+    In sharded mode every shard gets its own copy of the triggers/procs.
+    Raises if a database still lacks one of them afterwards.
     """
     base_dir = Path(__file__).resolve().parents[1]
     sql_path = os.path.join(base_dir, "init_db.sql")
@@ -19,26 +28,37 @@ def run_init_sql(app):
         app.logger.debug("init_db.sql not found at %s, skipping DB init", sql_path)
         return
 
-    # Check for an indicator: trigger existence
-    check_sql = text("SELECT COUNT(*) AS cnt FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE() AND TRIGGER_NAME = 'trg_after_ticket_insert'")
+    for engine in all_engines():
+        # SQLite databases get Python versions instead (sqlite_backend.init_sqlite_backend)
+        if engine.dialect.name != "sqlite":
+            _init_engine(app, engine, sql_path)
+
+
+def _missing_objects(engine) -> set:
+    triggers = text("SELECT TRIGGER_NAME FROM information_schema.TRIGGERS WHERE TRIGGER_SCHEMA = DATABASE()")
+    routines = text("SELECT ROUTINE_NAME FROM information_schema.ROUTINES WHERE ROUTINE_SCHEMA = DATABASE()")
+    with engine.connect() as conn:
+        present = {row[0] for row in conn.execute(triggers)} | {row[0] for row in conn.execute(routines)}
+    return set(_TRIGGERS + _ROUTINES) - present
+
+
+def _init_engine(app, engine, sql_path):
     try:
-        with db.engine.connect() as conn:
-            res = conn.execute(check_sql).mappings().first()
-            cnt = int(res['cnt'] or 0)
+        missing = _missing_objects(engine)
     except Exception:
         # If we cannot query information_schema, try to run the init anyway
-        cnt = 0
+        missing = set(_TRIGGERS + _ROUTINES)
 
-    if cnt > 0:
-        app.logger.debug("DB triggers/procs appear present (trg_after_ticket_insert found). Skipping init_sql.")
+    if not missing:
+        app.logger.debug("DB triggers/procs appear present on %s. Skipping init_sql.", engine.url.database)
         return
 
-    app.logger.info("Applying DB initialization SQL from %s", sql_path)
+    app.logger.info("Applying DB initialization SQL from %s to %s", sql_path, engine.url.database)
     raw = Path(sql_path).read_text(encoding="utf-8")
     parts = [p.strip() for p in raw.split("-- STATEMENT_BOUNDARY") if p.strip()]
 
     # Execute each block in its own execution context. Use begin() so DDL runs in a transaction.
-    with db.engine.begin() as conn:
+    with engine.begin() as conn:
         for part in parts:
             try:
                 app.logger.debug("Executing SQL block (first 80 chars): %s", part[:80])
@@ -47,4 +67,7 @@ def run_init_sql(app):
                 app.logger.exception("Error executing init SQL block: %s", e)
                 raise
 
+    missing = _missing_objects(engine)
+    if missing:
+        raise RuntimeError(f"init_db.sql did not create {', '.join(sorted(missing))} on {engine.url.database}")
     app.logger.info("Database initialization SQL applied successfully.")
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import date
+from flask import current_app, g
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import IntegrityError
+
+# Data topics that write routes invalidate. A fragment depends on a few of
+# them and is re-rendered only when one of their versions has moved on.
+TOPICS = ("drivers", "vehicles", "lots", "spots", "rates", "tickets", "payments", "staff")
+
+_READ_SQL = text("SELECT Topic, Version FROM DataVersion")
+_BUMP_SQL = text("UPDATE DataVersion SET Version = Version + 1 WHERE Topic IN :topics").bindparams(
+    bindparam("topics", expanding=True)
+)
+
+
+class FragmentCache:
+    """In-process cache of rendered template fragments keyed on data versions.
+
+    Each fragment name keeps only its latest rendering, so memory is bounded
+    by the number of fragments. The versions are counters in the DataVersion
+    table, so a write made through any worker invalidates every worker's
+    copy. The TTL bounds staleness from writes that bypass the app (direct
+    SQL, other tools).
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}  # name -> (key, expires_at, html)
+        self._ready = set()  # engines whose DataVersion table holds every topic
+
+    def _ensure_table(self, engine) -> None:
+        if engine in self._ready:
+            return
+        from . import db
+        from .models import DataVersion
+
+        db.metadata.create_all(engine, tables=[DataVersion.__table__])
+        with engine.connect() as conn:
+            present = {row[0] for row in conn.execute(_READ_SQL)}
+        for topic in TOPICS:
+            if topic not in present:
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(text("INSERT INTO DataVersion (Topic, Version) VALUES (:topic, 0)"), {"topic": topic})
+                except IntegrityError:
+                    pass  # inserted by another worker meanwhile
+        self._ready.add(engine)
+
+    def read_versions(self, engine) -> dict:
+        self._ensure_table(engine)
+        with engine.connect() as conn:
+            return dict(conn.execute(_READ_SQL).all())
+
+    def bump(self, engine, *topics) -> None:
+        if not topics or not self.ttl:
+            return
+        self._ensure_table(engine)
+        with engine.begin() as conn:
+            conn.execute(_BUMP_SQL, {"topics": list(topics)})
+
+    def render(self, name: str, key, render):
+        """Return the cached fragment `name`, calling render() only on a miss."""
+        with self._lock:
+            entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and entry[0] == key and entry[1] > now:
+            return entry[2]
+        html = render()
+        with self._lock:
+            # Stored under the versions read before rendering, so a concurrent write still invalidates it
+            self._entries[name] = (key, now + self.ttl, html)
+        return html
+
+
+def _versions_engine():
+    # The default bind, i.e. shard0 in sharded mode, holds the one DataVersion table
+    return current_app.extensions["sqlalchemy"].engine
+
+
+def data_versions() -> dict:
+    """Topic -> version, read from DataVersion once per request."""
+    if "data_versions" not in g:
+        g.data_versions = current_app.extensions["fragment_cache"].read_versions(_versions_engine())
+    return g.data_versions
+
+
+def bump(*topics) -> None:
+    """Move the versions of topics on, for this and every other worker."""
+    current_app.extensions["fragment_cache"].bump(_versions_engine(), *topics)
+    g.pop("data_versions", None)
+
+
+def _cache_tag(name, *topics, daily=False, caller=None):
+    """Template global used as {% call cache('name', 'topic', ...) %}...{% endcall %}."""
+    cache = current_app.extensions["fragment_cache"]
+    if not cache.ttl:
+        return caller()
+    versions = data_versions()
+    key = tuple(versions.get(t, 0) for t in topics)
+    if daily:
+        # Figures such as "today's tickets" roll over at midnight without any write
+        key += (date.today(),)
+    return cache.render(name, key, caller)
+
+
+def init_fragment_cache(app) -> None:
+    app.extensions["fragment_cache"] = FragmentCache(ttl=app.config["FRAGMENT_CACHE_TTL"])
+    app.add_template_global(_cache_tag, "cache")
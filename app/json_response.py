@@ -0,0 +1,79 @@
+import gzip
+from datetime import date, time
+from decimal import Decimal
+from flask import current_app, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # fall back to Flask's stdlib json encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _default(o):
+    # Numeric columns come back as Decimal; the API has always sent money as plain numbers
+    if isinstance(o, Decimal):
+        return float(o)
+    if isinstance(o, (date, time)):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+def _api_request() -> bool:
+    return has_request_context() and request.blueprint == "api"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider that encodes /api responses with orjson when it is installed.
+
+    orjson serialises datetime natively (ISO 8601) and Decimal through
+    _default, and writes bytes straight into the response body without an
+    intermediate str. Keys keep their insertion order. Everything outside
+    api_bp (tojson in templates, other blueprints) keeps Flask's defaults.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if not _api_request():
+            return super().dumps(obj, **kwargs)
+        if orjson is None or kwargs:
+            kwargs.setdefault("default", _default)
+            kwargs.setdefault("sort_keys", False)
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None or not _api_request():
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli JSON bodies above API_COMPRESS_MIN_SIZE bytes."""
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or "Content-Encoding" in response.headers
+        or not response.is_json
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    body = response.get_data()
+    if len(body) < current_app.config.get("API_COMPRESS_MIN_SIZE", 1024):
+        return response
+
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(body, quality=4))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(body, compresslevel=5))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
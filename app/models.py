@@ -15,6 +15,7 @@ class Driver(db.Model):
 
 class ParkingLot(db.Model):
     __tablename__ = "ParkingLot"
+    __table_args__ = (db.CheckConstraint("Capacity > 0", name="chk_lot_capacity"),)
     LotID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     LotName = db.Column(db.String(100), nullable=False, unique=True)
     Capacity = db.Column(db.Integer, nullable=False)
@@ -32,18 +33,18 @@ class Staff(db.Model):
     LastName = db.Column(db.String(50))
     Username = db.Column(db.String(50), nullable=False, unique=True)
     PasswordHash = db.Column(db.String(255), nullable=False)
-    Role = db.Column(Enum("Admin", "Attendant", name="role_enum"), nullable=False)
-    LotID = db.Column(db.Integer, ForeignKey("ParkingLot.LotID"))
+    Role = db.Column(Enum("Admin", "Attendant", name="role_enum", create_constraint=True), nullable=False)
+    LotID = db.Column(db.Integer, ForeignKey("ParkingLot.LotID", ondelete="SET NULL", onupdate="CASCADE"))
 
     lot = relationship("ParkingLot", back_populates="staff")
 
 class Vehicle(db.Model):
     __tablename__ = "Vehicle"
     LicensePlate = db.Column(db.String(15), primary_key=True)
-    VehicleType = db.Column(Enum("Car", "Bike", "Truck", "Handicap", name="veh_type_enum"), nullable=False)
+    VehicleType = db.Column(Enum("Car", "Bike", "Truck", "Handicap", name="veh_type_enum", create_constraint=True), nullable=False)
     Model = db.Column(db.String(50))
     Colour = db.Column(db.String(30))
-    DriverID = db.Column(db.Integer, ForeignKey("Driver.DriverID"))
+    DriverID = db.Column(db.Integer, ForeignKey("Driver.DriverID", ondelete="SET NULL", onupdate="CASCADE"))
 
     driver = relationship("Driver", back_populates="vehicles")
     tickets = relationship("ParkingTicket", back_populates="vehicle")
@@ -52,35 +53,41 @@ class ParkingSpot(db.Model):
     __tablename__ = "ParkingSpot"
     SpotID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     SpotNumber = db.Column(db.String(10), nullable=False)
-    SpotType = db.Column(Enum("Compact", "Standard", "Large", "Handicap", "EV", "Bike", name="spot_type_enum"), nullable=False)
+    SpotType = db.Column(Enum("Compact", "Standard", "Large", "Handicap", "EV", "Bike", name="spot_type_enum", create_constraint=True), nullable=False)
     IsOccupied = db.Column(db.Boolean, server_default=db.text("FALSE"))
-    LotID = db.Column(db.Integer, ForeignKey("ParkingLot.LotID"), nullable=False)
+    LotID = db.Column(db.Integer, ForeignKey("ParkingLot.LotID", ondelete="CASCADE", onupdate="CASCADE"), nullable=False)
 
     lot = relationship("ParkingLot", back_populates="spots")
     tickets = relationship("ParkingTicket", back_populates="spot")
 
 class ParkingRate(db.Model):
     __tablename__ = "ParkingRate"
+    __table_args__ = (db.CheckConstraint("RatePerHour >= 0", name="chk_rate_per_hour"),)
     RateID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     RatePerHour = db.Column(db.Numeric(10, 2), nullable=False)
-    VehicleType = db.Column(Enum("Car", "Bike", "Truck", "Handicap", name="rate_vehicle_enum"), nullable=False)
-    SpotType = db.Column(Enum("Compact", "Standard", "Large", "Handicap", "EV", "Bike", name="rate_spot_enum"), nullable=False)
+    VehicleType = db.Column(Enum("Car", "Bike", "Truck", "Handicap", name="rate_vehicle_enum", create_constraint=True), nullable=False)
+    SpotType = db.Column(Enum("Compact", "Standard", "Large", "Handicap", "EV", "Bike", name="rate_spot_enum", create_constraint=True), nullable=False)
     GracePerMinute = db.Column(db.Integer, server_default=db.text("15"))
-    LotID = db.Column(db.Integer, ForeignKey("ParkingLot.LotID"))
+    LotID = db.Column(db.Integer, ForeignKey("ParkingLot.LotID", ondelete="CASCADE", onupdate="CASCADE"))
 
     lot = relationship("ParkingLot", back_populates="rates")
     tickets = relationship("ParkingTicket", back_populates="rate")
 
 class ParkingTicket(db.Model):
     __tablename__ = "ParkingTicket"
+    __table_args__ = (
+        db.Index("idx_ticket_plate_exit", "LicensePlate", "ExitTime"),
+        db.Index("idx_ticket_exit", "ExitTime"),
+        db.Index("idx_ticket_status_exit", "PaymentStatus", "ExitTime"),
+    )
     TicketID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     EntryTime = db.Column(db.DateTime, nullable=False)
     ExitTime = db.Column(db.DateTime)
-    PaymentStatus = db.Column(Enum("Unpaid", "Paid", "Partial", name="payment_status_enum"), server_default="Unpaid")
+    PaymentStatus = db.Column(Enum("Unpaid", "Paid", "Partial", name="payment_status_enum", create_constraint=True), server_default="Unpaid")
     TotalFee = db.Column(db.Numeric(10, 2))
-    LicensePlate = db.Column(db.String(15), ForeignKey("Vehicle.LicensePlate"))
-    SpotID = db.Column(db.Integer, ForeignKey("ParkingSpot.SpotID"))
-    RateID = db.Column(db.Integer, ForeignKey("ParkingRate.RateID"))
+    LicensePlate = db.Column(db.String(15), ForeignKey("Vehicle.LicensePlate", ondelete="SET NULL", onupdate="CASCADE"))
+    SpotID = db.Column(db.Integer, ForeignKey("ParkingSpot.SpotID", ondelete="SET NULL", onupdate="CASCADE"))
+    RateID = db.Column(db.Integer, ForeignKey("ParkingRate.RateID", ondelete="SET NULL", onupdate="CASCADE"))
 
     vehicle = relationship("Vehicle", back_populates="tickets")
     spot = relationship("ParkingSpot", back_populates="tickets")
@@ -89,13 +96,51 @@ class ParkingTicket(db.Model):
 
 class Payment(db.Model):
     __tablename__ = "Payment"
+    __table_args__ = (
+        db.Index("idx_payment_timestamp", "PaymentTimestamp"),
+        db.CheckConstraint("Amount > 0", name="chk_payment_amount"),
+    )
     PaymentID = db.Column(db.Integer, primary_key=True, autoincrement=True)
     Amount = db.Column(db.Numeric(10, 2), nullable=False)
-    PaymentMethod = db.Column(Enum("Cash", "Credit Card", "UPI", "AppWallet", name="payment_method_enum"), nullable=False)
-    TransactionStatus = db.Column(Enum("Success", "Failed", "Pending", name="transaction_status_enum"), server_default="Success")
+    PaymentMethod = db.Column(Enum("Cash", "Credit Card", "UPI", "AppWallet", name="payment_method_enum", create_constraint=True), nullable=False)
+    TransactionStatus = db.Column(Enum("Success", "Failed", "Pending", name="transaction_status_enum", create_constraint=True), server_default="Success")
     PaymentTimestamp = db.Column(db.TIMESTAMP, server_default=db.text("CURRENT_TIMESTAMP"))
-    TicketID = db.Column(db.Integer, ForeignKey("ParkingTicket.TicketID"), nullable=False)
-    StaffID = db.Column(db.Integer, ForeignKey("Staff.StaffID"))
+    TicketID = db.Column(db.Integer, ForeignKey("ParkingTicket.TicketID", ondelete="CASCADE", onupdate="CASCADE"), nullable=False)
+    StaffID = db.Column(db.Integer, ForeignKey("Staff.StaffID", ondelete="SET NULL", onupdate="CASCADE"))
 
     ticket = relationship("ParkingTicket", back_populates="payments")
 
+class Settlement(db.Model):
+    """End-of-day totals and fee reconciliation of one lot, written by `flask settle`."""
+    __tablename__ = "Settlement"
+    __table_args__ = (db.Index("idx_settlement_day_lot", "BusinessDate", "LotID"),)
+    SettlementID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    BusinessDate = db.Column(db.Date, nullable=False)
+    LotID = db.Column(db.Integer)  # NULL: tickets whose spot and rate are both gone
+    TicketsClosed = db.Column(db.Integer, nullable=False, server_default=db.text("0"))
+    TotalBilled = db.Column(db.Numeric(12, 2), nullable=False, server_default=db.text("0"))
+    PaidAgainstBilled = db.Column(db.Numeric(12, 2), nullable=False, server_default=db.text("0"))
+    Outstanding = db.Column(db.Numeric(12, 2), nullable=False, server_default=db.text("0"))
+    MismatchedTickets = db.Column(db.Integer, nullable=False, server_default=db.text("0"))
+    TotalCollected = db.Column(db.Numeric(12, 2), nullable=False, server_default=db.text("0"))
+    FailedPayments = db.Column(db.Integer, nullable=False, server_default=db.text("0"))
+    PendingPayments = db.Column(db.Integer, nullable=False, server_default=db.text("0"))
+    CreatedAt = db.Column(db.TIMESTAMP, server_default=db.text("CURRENT_TIMESTAMP"))
+
+class SettlementLine(db.Model):
+    """Successful payments of one lot and day, per PaymentMethod and staff member."""
+    __tablename__ = "SettlementLine"
+    __table_args__ = (db.Index("idx_settlement_line_day_lot", "BusinessDate", "LotID"),)
+    LineID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    BusinessDate = db.Column(db.Date, nullable=False)
+    LotID = db.Column(db.Integer)
+    PaymentMethod = db.Column(Enum("Cash", "Credit Card", "UPI", "AppWallet", name="payment_method_enum", create_constraint=True), nullable=False)
+    StaffID = db.Column(db.Integer)  # NULL: not attributed to a staff member
+    PaymentCount = db.Column(db.Integer, nullable=False)
+    Amount = db.Column(db.Numeric(12, 2), nullable=False)
+
+class DataVersion(db.Model):
+    """Version of one fragment-cache topic, moved on by every write request; see fragment_cache.py."""
+    __tablename__ = "DataVersion"
+    Topic = db.Column(db.String(20), primary_key=True)
+    Version = db.Column(db.BigInteger, nullable=False, server_default=db.text("0"))
@@ -0,0 +1,279 @@
+import threading
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from .sharding import scatter_rows
+
+_OPEN_PLATES_SQL = "SELECT TicketID, LicensePlate FROM ParkingTicket WHERE ExitTime IS NULL AND LicensePlate IS NOT NULL"
+# Open tickets for the plate as read (idx_ticket_plate_exit) plus the index's matches by primary key
+_VERIFY_SQL = "SELECT TicketID, LicensePlate FROM ParkingTicket WHERE ExitTime IS NULL AND (LicensePlate = :plate{ids})"
+
+# Characters ANPR cameras commonly confuse. Both sides of each pair fold to the
+# same canonical character so e.g. 'KA01MJ1234' and 'KAO1MJI234' share a key.
+_CONFUSABLE = str.maketrans({"O": "0", "Q": "0", "D": "0", "I": "1", "L": "1", "Z": "2", "S": "5", "G": "6", "B": "8"})
+
+
+def canonical_plate(plate: str) -> str:
+    """Upper-case, strip separators and fold confusable characters."""
+    if not plate:
+        return ""
+    return "".join(ch for ch in plate.upper() if ch.isalnum()).translate(_CONFUSABLE)
+
+
+def _deletes(key: str):
+    """All strings obtained by deleting exactly one character from key."""
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, returning limit + 1 as soon as it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > limit:
+            return limit + 1
+        prev = cur
+    return prev[-1]
+
+
+def _match_order(plate: str):
+    # Exact plate first, then confusable-only matches, then single edits
+    return lambda m: (m[2], m[1] != plate, m[0])
+
+
+class PlateIndex:
+    """In-memory index of license plate -> open ParkingTicket IDs.
+
+    Exact lookups go through a dict keyed on the plate as stored. Approximate
+    lookups fold confusable characters (0/O, 8/B, ...) into a canonical key and
+    use a single-deletion neighbourhood index on that key, so a misread of one
+    character (substitution, insertion or omission) is found with O(len(plate))
+    dict probes regardless of how many tickets are open.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._pending = None  # events seen while a load's SELECT runs, replayed on top of it
+        self._plate_by_ticket = {}
+        self._by_plate = {}
+        self._by_canonical = {}
+        self._by_delete = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def load(self, rows) -> None:
+        """(Re)build the index from (TicketID, LicensePlate) rows of open tickets.
+
+        Events recorded since ensure_loaded() started its query are replayed on
+        top, so a ticket opened or closed while the rows were read is not lost.
+        """
+        with self._lock:
+            self._plate_by_ticket.clear()
+            self._by_plate.clear()
+            self._by_canonical.clear()
+            self._by_delete.clear()
+            for ticket_id, plate in rows:
+                self._add(int(ticket_id), plate)
+            for event in self._pending or ():
+                event()
+            self._pending = None
+            self._loaded = True
+
+    def ensure_loaded(self, fetch_rows) -> None:
+        """Load the index from fetch_rows() unless that has already happened.
+
+        Only one thread runs the query; add/discard/rename calls made while it
+        runs are buffered and replayed by load().
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            with self._lock:
+                self._pending = []
+            try:
+                rows = fetch_rows()
+            except Exception:
+                with self._lock:
+                    self._pending = None
+                raise
+            self.load(rows)
+
+    def _record(self, event) -> None:
+        # Caller holds self._lock
+        if self._pending is not None:
+            self._pending.append(event)
+        event()
+
+    def _add(self, ticket_id: int, plate: str) -> None:
+        self._plate_by_ticket[ticket_id] = plate
+        self._by_plate.setdefault(plate, set()).add(ticket_id)
+        key = canonical_plate(plate)
+        if key not in self._by_canonical:
+            for d in _deletes(key):
+                self._by_delete.setdefault(d, set()).add(key)
+        self._by_canonical.setdefault(key, set()).add(ticket_id)
+
+    def _discard(self, ticket_id: int) -> None:
+        plate = self._plate_by_ticket.pop(ticket_id, None)
+        if plate is None:
+            return
+        ids = self._by_plate.get(plate)
+        if ids is not None:
+            ids.discard(ticket_id)
+            if not ids:
+                del self._by_plate[plate]
+        key = canonical_plate(plate)
+        ids = self._by_canonical.get(key)
+        if ids is not None:
+            ids.discard(ticket_id)
+            if not ids:
+                del self._by_canonical[key]
+                for d in _deletes(key):
+                    keys = self._by_delete.get(d)
+                    if keys is not None:
+                        keys.discard(key)
+                        if not keys:
+                            del self._by_delete[d]
+
+    def add(self, ticket_id: int, plate: str) -> None:
+        """Record an open ticket (replacing any previous plate for it)."""
+        if not plate:
+            return
+        def event():
+            self._discard(ticket_id)
+            self._add(ticket_id, plate)
+
+        with self._lock:
+            self._record(event)
+
+    def discard(self, ticket_id: int) -> None:
+        """Forget a ticket once it has exited or been deleted."""
+        with self._lock:
+            self._record(lambda: self._discard(ticket_id))
+
+    def rename_plate(self, old_plate: str, new_plate: str = None) -> None:
+        """Mirror Vehicle.LicensePlate ON UPDATE CASCADE / ON DELETE SET NULL."""
+        def event():
+            for ticket_id in list(self._by_plate.get(old_plate, ())):
+                self._discard(ticket_id)
+                if new_plate:
+                    self._add(ticket_id, new_plate)
+
+        with self._lock:
+            self._record(event)
+
+    def lookup(self, plate: str, fuzzy: bool = True):
+        """Return [(ticket_id, stored_plate, distance)] best matches first.
+
+        distance is 0 for an exact or confusable-only match and 1 for a single
+        character edit on the canonical key.
+        """
+        key = canonical_plate(plate)
+        with self._lock:
+            hits = {tid: 0 for tid in self._by_plate.get(plate, ())}
+            if fuzzy and key:
+                for tid in self._by_canonical.get(key, ()):
+                    hits.setdefault(tid, 0)
+                candidates = set()
+                # key with one char deleted == stored key (query has an extra char)
+                for d in _deletes(key):
+                    if d in self._by_canonical:
+                        candidates.add(d)
+                    candidates.update(self._by_delete.get(d, ()))
+                # stored key with one char deleted == query key (query dropped a char)
+                candidates.update(self._by_delete.get(key, ()))
+                candidates.discard(key)
+                for cand in candidates:
+                    dist = _edit_distance(key, cand, 1)
+                    if dist <= 1:
+                        for tid in self._by_canonical.get(cand, ()):
+                            hits.setdefault(tid, dist)
+            matches = [(tid, self._plate_by_ticket[tid], dist) for tid, dist in hits.items()]
+        return sorted(matches, key=_match_order(plate))
+
+
+def current_plate_index() -> PlateIndex:
+    """Return the app's PlateIndex as-is, for write paths that only keep it in sync."""
+    return current_app.extensions["plate_index"]
+
+
+def get_plate_index() -> PlateIndex:
+    """Return the app's PlateIndex, loading it from the database(s) on first use."""
+    index = current_plate_index()
+    index.ensure_loaded(lambda: scatter_rows(_OPEN_PLATES_SQL))
+    return index
+
+
+def find_open_tickets(plate: str, fuzzy: bool = True):
+    """PlateIndex.lookup(), checked against the database unless PLATE_INDEX_VERIFY is off.
+
+    The index only sees writes made by this process. One query per database
+    confirms the matches by primary key, dropping tickets closed elsewhere, and
+    picks up open tickets for the exact plate that another worker created.
+    """
+    index = get_plate_index()
+    matches = index.lookup(plate, fuzzy=fuzzy)
+    if not current_app.config["PLATE_INDEX_VERIFY"]:
+        return matches
+    params = {"plate": plate}
+    params.update((f"id{i}", tid) for i, tid in enumerate(tid for tid, _, _ in matches))
+    ids = ", ".join(f":{name}" for name in params if name != "plate")
+    sql = _VERIFY_SQL.format(ids=f" OR TicketID IN ({ids})" if ids else "")
+    open_plates = {int(ticket_id): stored_plate for ticket_id, stored_plate in scatter_rows(sql, params)}
+    for tid, _, _ in matches:
+        if tid not in open_plates:
+            index.discard(tid)
+    known = {tid for tid, _, _ in matches}
+    for tid, stored_plate in open_plates.items():
+        if tid not in known:
+            index.add(tid, stored_plate)
+            matches.append((tid, stored_plate, 0))
+    return sorted(
+        ((tid, open_plates[tid], dist) for tid, _, dist in matches if tid in open_plates),
+        key=_match_order(plate),
+    )
+
+
+def _on_vehicle_update(mapper, connection, target):
+    # Plate edits made through the ORM cascade to ParkingTicket in MySQL. The
+    # index follows once the session commits, so a rolled-back edit is not applied.
+    hist = inspect(target).attrs.LicensePlate.history
+    if hist.deleted and hist.added:
+        object_session(target).info.setdefault("plate_renames", []).append((hist.deleted[0], hist.added[0]))
+
+
+def _after_commit(session):
+    renames = session.info.pop("plate_renames", None)
+    if renames and has_app_context():
+        index = current_app.extensions.get("plate_index")
+        if index is not None:
+            for old_plate, new_plate in renames:
+                # Also recorded while a load is in progress
+                index.rename_plate(old_plate, new_plate)
+
+
+def _after_rollback(session):
+    session.info.pop("plate_renames", None)
+
+
+def init_plate_index(app) -> None:
+    from .models import Vehicle
+
+    app.extensions["plate_index"] = PlateIndex()
+    for target, name, fn in (
+        (Vehicle, "after_update", _on_vehicle_update),
+        (Session, "after_commit", _after_commit),
+        (Session, "after_rollback", _after_rollback),
+    ):
+        if not event.contains(target, name, fn):
+            event.listen(target, name, fn)
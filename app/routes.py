@@ -1,26 +1,115 @@
 from flask import Blueprint, render_template, request, redirect, url_for, jsonify, abort
-from sqlalchemy import text, func, case
+from sqlalchemy import func, case
 from . import db
-from .models import Driver, Vehicle, ParkingLot, ParkingSpot, ParkingRate, ParkingTicket, Payment, Staff
-from datetime import datetime
+from .models import Driver, Vehicle, ParkingLot, ParkingSpot, ParkingRate, ParkingTicket, Payment, Staff, Settlement, SettlementLine
+from datetime import date, datetime, timedelta
 import math
-from .db_helpers import add_new_ticket_and_occupy_spot, create_parking_lot_with_default_rates
+from .db_helpers import (
+    add_new_ticket_and_occupy_spot,
+    available_spots_count,
+    create_parking_lot_with_default_rates,
+    driver_total_spent,
+    process_vehicle_exit,
+    swap_parking_spots,
+)
+from .plate_index import current_plate_index, find_open_tickets
+from .alerts import active_alerts, current_alert_engine, merge_alerts, outstanding_alerts, retrack_tickets, shard_outstanding_alerts, track_ticket
+from .json_response import compress_response
+from .sharding import gather, on_current_shard, replicate, scatter, shard_keys, shard_routed, use_shard
+from .fragment_cache import bump
+from sqlalchemy.orm import joinedload
 
 main_bp = Blueprint("main", __name__)
 api_bp = Blueprint("api", __name__)
+api_bp.after_request(compress_response)
 
-@main_bp.route("/")
-def index():
-    lots = ParkingLot.query.all()
-    tickets_unpaid = ParkingTicket.query.filter_by(PaymentStatus="Unpaid").count()
-    spots_total = ParkingSpot.query.count()
-    spots_occupied = ParkingSpot.query.filter_by(IsOccupied=True).count()
+# Fragment-cache topics touched by each entity's CRUD routes (new_x/edit_x/delete_x),
+# including what the FK cascades and triggers change
+_ENTITY_TOPICS = {
+    "driver": ("drivers", "vehicles"),
+    "vehicle": ("vehicles", "tickets"),
+    "lot": ("lots", "spots", "rates", "staff", "tickets"),
+    "spot": ("spots", "tickets"),
+    "rate": ("rates", "tickets"),
+    "ticket": ("tickets", "spots", "payments"),
+    "payment": ("payments", "tickets"),
+    "staff": ("staff", "payments"),
+}
+
+_API_TOPICS = {
+    "api.swap_spot": ("tickets", "spots"),
+    "api.process_exit": ("tickets", "spots", "payments"),
+    "api.api_add_ticket": ("tickets", "spots"),
+    "api.api_create_lot_default": ("lots", "rates"),
+}
+
+
+def _invalidate_fragments(response):
+    """after_request hook: successful writes move the versions their fragments depend on."""
+    if request.method == "POST" and response.status_code < 400:
+        if request.blueprint == "main":
+            topics = _ENTITY_TOPICS.get(request.endpoint.rsplit("_", 1)[-1], ())
+        else:
+            topics = _API_TOPICS.get(request.endpoint, ())
+        bump(*topics)
+    return response
+
+
+main_bp.after_request(_invalidate_fragments)
+api_bp.after_request(_invalidate_fragments)
+
+
+def _ticket_opened(ticket_id: int, license_plate: str):
+    # Keep in-memory open-ticket structures in step with ParkingTicket
+    current_plate_index().add(ticket_id, license_plate)
+    track_ticket(ticket_id)
+
+
+def _ticket_closed(ticket_id: int):
+    current_plate_index().discard(ticket_id)
+    current_alert_engine().untrack(ticket_id)
+
+
+# Sharded mode: Driver and Vehicle are written to shard0 by the views, then
+# copied to the other shards with these (see sharding.replicate)
+
+def _row_values(row) -> dict:
+    return {c.key: getattr(row, c.key) for c in row.__table__.columns}
+
+
+def _replica_save(model, values: dict):
+    db.session.merge(model(**values))
+
+
+def _replica_delete(model, pk):
+    row = db.session.get(model, pk)
+    if row is not None:
+        db.session.delete(row)
+
+
+def _all_rows(query_fn):
+    """query_fn() on every shard, e.g. a form's lot dropdown; just query_fn() without sharding."""
+    return gather(query_fn) if shard_keys() else query_fn()
+
+
+def _require_current_shard(**ids):
+    # A row cannot be moved to, or point at, a lot/spot/ticket on another shard
+    for name, record_id in ids.items():
+        if not on_current_shard(record_id):
+            abort(400, f"{name} {record_id} belongs to another shard")
 
-    drivers_count = Driver.query.count()
-    vehicles_count = Vehicle.query.count()
-    staff_count = db.session.query(func.count()).select_from(Staff).scalar()
 
-    tickets_today = db.session.query(func.count(ParkingTicket.TicketID)).filter(func.date(ParkingTicket.EntryTime) == func.curdate()).scalar() or 0
+def _dashboard_counts():
+    """Headline counters for one database (one shard in sharded mode)."""
+    return dict(
+        drivers_count=Driver.query.count(),
+        vehicles_count=Vehicle.query.count(),
+        tickets_today=int(db.session.query(func.count(ParkingTicket.TicketID)).filter(func.date(ParkingTicket.EntryTime) == func.curdate()).scalar() or 0),
+        tickets_unpaid=ParkingTicket.query.filter_by(PaymentStatus="Unpaid").count(),
+    )
+
+
+def _dashboard_charts():
     revenue_today = db.session.query(func.coalesce(func.sum(Payment.Amount), 0)).filter(func.date(Payment.PaymentTimestamp) == func.curdate()).scalar() or 0
     revenue_month = db.session.query(func.coalesce(func.sum(Payment.Amount), 0)).filter(func.month(Payment.PaymentTimestamp) == func.month(func.now()), func.year(Payment.PaymentTimestamp) == func.year(func.now())).scalar() or 0
 
@@ -43,6 +132,15 @@ def index():
     )
     revenue_per_day = list(reversed([(str(r.d), float(r.s)) for r in revenue_per_day_rows]))
 
+    return dict(
+        revenue_today=float(revenue_today or 0),
+        revenue_month=float(revenue_month or 0),
+        tickets_per_day=tickets_per_day,
+        revenue_per_day=revenue_per_day,
+    )
+
+
+def _dashboard_occupancy():
     # Live occupancy per lot
     # Use lot Capacity as total; occupied from spots table
     occupancy_rows = (
@@ -69,42 +167,92 @@ def index():
         }
         for row in occupancy_rows
     ]
+    return dict(occupancy=occupancy)
 
-    # Alerts: overdue/unpaid open tickets (no ExitTime and Unpaid)
-    alerts_tickets = (
-        ParkingTicket.query.filter(ParkingTicket.PaymentStatus == "Unpaid")
-        .order_by(ParkingTicket.EntryTime.asc())
-        .limit(5)
-        .all()
-    )
 
+def _dashboard_recent():
     # Recent activity
-    recent_tickets = ParkingTicket.query.order_by(ParkingTicket.TicketID.desc()).limit(5).all()
-    recent_payments = Payment.query.order_by(Payment.PaymentID.desc()).limit(5).all()
-
-    return render_template(
-        "index.html",
-        lots=lots,
-        tickets_unpaid=tickets_unpaid,
-        spots_total=spots_total,
-        spots_occupied=spots_occupied,
-        drivers_count=drivers_count,
-        vehicles_count=vehicles_count,
-        staff_count=staff_count,
-        tickets_today=int(tickets_today or 0),
-        revenue_today=float(revenue_today or 0),
-        revenue_month=float(revenue_month or 0),
-        tickets_per_day=tickets_per_day,
-        revenue_per_day=revenue_per_day,
-        occupancy=occupancy,
-        alerts_tickets=alerts_tickets,
-        recent_tickets=recent_tickets,
-        recent_payments=recent_payments,
+    return dict(
+        recent_tickets=ParkingTicket.query.order_by(ParkingTicket.TicketID.desc()).limit(5).all(),
+        recent_payments=Payment.query.order_by(Payment.PaymentID.desc()).limit(5).all(),
     )
 
+
+def _dashboard_outstanding():
+    # Exited tickets that still owe money, oldest exit first
+    return dict(outstanding=shard_outstanding_alerts(limit=5))
+
+
+_DASHBOARD_PANELS = {
+    "counts": _dashboard_counts,
+    "charts": _dashboard_charts,
+    "occupancy": _dashboard_occupancy,
+    "recent": _dashboard_recent,
+    "outstanding": _dashboard_outstanding,
+}
+
+_SUMMED_STATS = ("tickets_today", "tickets_unpaid", "revenue_today", "revenue_month")
+# Reference data is copied to the shards that need it; the first shard holds all of it
+_FIRST_SHARD_STATS = ("drivers_count", "vehicles_count")
+
+
+def _merge_dashboard_stats(parts):
+    """Combine per-shard results of one dashboard panel."""
+    if len(parts) == 1:
+        return parts[0]
+    merged = {}
+    for key in parts[0]:
+        values = [p[key] for p in parts]
+        if key in _SUMMED_STATS:
+            merged[key] = sum(values)
+        elif key in _FIRST_SHARD_STATS:
+            merged[key] = values[0]
+        elif key == "occupancy":
+            merged[key] = sorted((o for v in values for o in v), key=lambda o: o["lotId"])
+        elif key in ("tickets_per_day", "revenue_per_day"):
+            # Any date in the global last 7 is also in the last 7 of every shard that has it
+            totals = {}
+            for v in values:
+                for day, value in v:
+                    totals[day] = totals.get(day, 0) + value
+            merged[key] = sorted(totals.items())[-7:]
+        elif key == "recent_tickets":
+            merged[key] = sorted((t for v in values for t in v), key=lambda t: t.TicketID, reverse=True)[:5]
+        elif key == "recent_payments":
+            merged[key] = sorted((x for v in values for x in v), key=lambda x: x.PaymentID, reverse=True)[:5]
+        elif key == "outstanding":
+            merged[key] = merge_alerts(values, limit=5)
+    return merged
+
+
+class _Dashboard:
+    """Lazy per-request panel loader for index.html.
+
+    Panels are only queried when their cached fragment is missing, so an
+    unchanged dashboard renders without touching the database.
+    """
+
+    def __init__(self):
+        self._panels = {}
+
+    def load(self, name: str):
+        if name not in self._panels:
+            # Scatter-gather: each shard computes its figures in parallel
+            self._panels[name] = _merge_dashboard_stats(scatter(_DASHBOARD_PANELS[name]))
+        return self._panels[name]
+
+
+@main_bp.route("/")
+def index():
+    # Alerts: open tickets past their grace period or the lot's maximum stay
+    alerts = active_alerts(limit=5)
+
+    return render_template("index.html", alerts=alerts, dashboard=_Dashboard())
+
 @main_bp.route("/drivers")
 def list_drivers():
-    drivers = Driver.query.order_by(Driver.DriverID.asc()).all()
+    # Queries are passed unevaluated and only run if the cached table fragment is stale
+    drivers = Driver.query.order_by(Driver.DriverID.asc())
     return render_template("drivers.html", drivers=drivers)
 
 @main_bp.route("/drivers/new", methods=["GET", "POST"])
@@ -119,6 +267,7 @@ def new_driver():
         d = Driver(FirstName=first, LastName=last, PhoneNumber=phone, Email=email)
         db.session.add(d)
         db.session.commit()
+        replicate(_replica_save, Driver, _row_values(d))
         return redirect(url_for("main.list_drivers"))
     return render_template("driver_form.html")
 
@@ -131,6 +280,7 @@ def edit_driver(driver_id: int):
         driver.PhoneNumber = request.form.get("PhoneNumber") or driver.PhoneNumber
         driver.Email = request.form.get("Email")
         db.session.commit()
+        replicate(_replica_save, Driver, _row_values(driver))
         return redirect(url_for("main.list_drivers"))
     return render_template("driver_form.html", driver=driver)
 
@@ -139,18 +289,20 @@ def delete_driver(driver_id: int):
     driver = Driver.query.get_or_404(driver_id)
     db.session.delete(driver)
     db.session.commit()
+    replicate(_replica_delete, Driver, driver_id)
     return redirect(url_for("main.list_drivers"))
 
 @main_bp.route("/tickets")
 def list_tickets():
-    tickets = ParkingTicket.query.order_by(ParkingTicket.TicketID.asc()).all()
+    tickets = ParkingTicket.query.options(joinedload(ParkingTicket.spot)).order_by(ParkingTicket.TicketID.asc())
     return render_template("tickets.html", tickets=tickets)
 
 @main_bp.route("/tickets/new", methods=["GET", "POST"])
+@shard_routed(form_key="SpotID")
 def new_ticket():
     vehicles = Vehicle.query.all()
-    spots = ParkingSpot.query.filter_by(IsOccupied=False).all()
-    rates = ParkingRate.query.all()
+    spots = _all_rows(lambda: ParkingSpot.query.filter_by(IsOccupied=False).all())
+    rates = _all_rows(lambda: ParkingRate.query.all())
     if request.method == "POST":
         license_plate = request.form.get("LicensePlate")
         spot_id = request.form.get("SpotID", type=int)
@@ -160,42 +312,62 @@ def new_ticket():
             abort(400, "All fields are required")
         try:
             # Use stored procedure to create ticket and mark spot occupied atomically
-            add_new_ticket_and_occupy_spot(license_plate, spot_id, rate_id, entry_time)
+            ticket_id = add_new_ticket_and_occupy_spot(license_plate, spot_id, rate_id, entry_time)
         except Exception as e:
             # Surface DB errors to client
             abort(400, str(e))
+        if ticket_id:
+            _ticket_opened(ticket_id, license_plate)
         return redirect(url_for("main.list_tickets"))
     return render_template("ticket_form.html", vehicles=vehicles, spots=spots, rates=rates)
 
+def _form_datetime(name: str):
+    """Parse a 'YYYY-MM-DD HH:MM:SS' form field; the SQLite DateTime type only accepts datetime objects."""
+    value = request.form.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(400, f"{name} must be YYYY-MM-DD HH:MM:SS")
+
 @main_bp.route("/tickets/<int:ticket_id>/edit", methods=["GET", "POST"])
+@shard_routed(url_arg="ticket_id")
 def edit_ticket(ticket_id: int):
     ticket = ParkingTicket.query.get_or_404(ticket_id)
     vehicles = Vehicle.query.all()
     spots = ParkingSpot.query.all()
     rates = ParkingRate.query.all()
     if request.method == "POST":
+        _require_current_shard(SpotID=request.form.get("SpotID", type=int), RateID=request.form.get("RateID", type=int))
         ticket.LicensePlate = request.form.get("LicensePlate") or ticket.LicensePlate
         ticket.SpotID = request.form.get("SpotID", type=int) or ticket.SpotID
         ticket.RateID = request.form.get("RateID", type=int) or ticket.RateID
-        ticket.EntryTime = request.form.get("EntryTime") or ticket.EntryTime
-        ticket.ExitTime = request.form.get("ExitTime") or ticket.ExitTime
+        ticket.EntryTime = _form_datetime("EntryTime") or ticket.EntryTime
+        ticket.ExitTime = _form_datetime("ExitTime") or ticket.ExitTime
         db.session.commit()
+        if ticket.ExitTime is None:
+            _ticket_opened(ticket.TicketID, ticket.LicensePlate)
+        else:
+            _ticket_closed(ticket.TicketID)
         return redirect(url_for("main.list_tickets"))
     return render_template("ticket_form.html", ticket=ticket, vehicles=vehicles, spots=spots, rates=rates)
 
 @main_bp.route("/tickets/<int:ticket_id>/delete", methods=["POST"])
+@shard_routed(url_arg="ticket_id")
 def delete_ticket(ticket_id: int):
     ticket = ParkingTicket.query.get_or_404(ticket_id)
     db.session.delete(ticket)
     db.session.commit()
+    _ticket_closed(ticket_id)
     return redirect(url_for("main.list_tickets"))
 
 # ---- Vehicle CRUD ----
 
 @main_bp.route("/vehicles")
 def list_vehicles():
-    vehicles = Vehicle.query.order_by(Vehicle.LicensePlate.asc()).all()
-    drivers = Driver.query.all()
+    vehicles = Vehicle.query.order_by(Vehicle.LicensePlate.asc())
+    drivers = Driver.query
     return render_template("vehicles.html", vehicles=vehicles, drivers=drivers)
 
 @main_bp.route("/vehicles/new", methods=["GET", "POST"])
@@ -212,6 +384,7 @@ def new_vehicle():
         v = Vehicle(LicensePlate=plate, VehicleType=vtype, Model=model, Colour=colour, DriverID=driver_id)
         db.session.add(v)
         db.session.commit()
+        replicate(_replica_save, Vehicle, _row_values(v))
         return redirect(url_for("main.list_vehicles"))
     return render_template("vehicle_form.html", drivers=drivers)
 
@@ -225,6 +398,7 @@ def edit_vehicle(license_plate: str):
         vehicle.Colour = request.form.get("Colour")
         vehicle.DriverID = request.form.get("DriverID", type=int)
         db.session.commit()
+        replicate(_replica_save, Vehicle, _row_values(vehicle))
         return redirect(url_for("main.list_vehicles"))
     return render_template("vehicle_form.html", vehicle=vehicle, drivers=drivers)
 
@@ -233,13 +407,16 @@ def delete_vehicle(license_plate: str):
     vehicle = Vehicle.query.get_or_404(license_plate)
     db.session.delete(vehicle)
     db.session.commit()
+    replicate(_replica_delete, Vehicle, license_plate)
+    # ParkingTicket.LicensePlate is ON DELETE SET NULL
+    current_plate_index().rename_plate(license_plate, None)
     return redirect(url_for("main.list_vehicles"))
 
 # ---- Parking Lot CRUD ----
 
 @main_bp.route("/lots")
 def list_lots():
-    lots = ParkingLot.query.order_by(ParkingLot.LotID.asc()).all()
+    lots = ParkingLot.query.order_by(ParkingLot.LotID.asc())
     return render_template("lots.html", lots=lots)
 
 @main_bp.route("/lots/new", methods=["GET", "POST"])
@@ -249,17 +426,22 @@ def new_lot():
         capacity = request.form.get("Capacity", type=int)
         location = request.form.get("Location")
         levels = request.form.get("Levels", type=int)
+        shard = request.form.get("Shard") or None  # sharded mode: the shard that will own the lot
         if not (name and capacity is not None):
             abort(400, "LotName and Capacity are required")
+        if shard is not None and shard not in shard_keys():
+            abort(400, f"Unknown shard {shard}")
         try:
             # Use stored procedure to create lot and associated default rates in a single transaction
-            create_parking_lot_with_default_rates(name, capacity, location, levels)
+            with use_shard(shard):
+                create_parking_lot_with_default_rates(name, capacity, location, levels)
         except Exception as e:
             abort(400, str(e))
         return redirect(url_for("main.list_lots"))
-    return render_template("lot_form.html")
+    return render_template("lot_form.html", shards=shard_keys())
 
 @main_bp.route("/lots/<int:lot_id>/edit", methods=["GET", "POST"])
+@shard_routed(url_arg="lot_id")
 def edit_lot(lot_id: int):
     lot = ParkingLot.query.get_or_404(lot_id)
     if request.method == "POST":
@@ -272,6 +454,7 @@ def edit_lot(lot_id: int):
     return render_template("lot_form.html", lot=lot)
 
 @main_bp.route("/lots/<int:lot_id>/delete", methods=["POST"])
+@shard_routed(url_arg="lot_id")
 def delete_lot(lot_id: int):
     lot = ParkingLot.query.get_or_404(lot_id)
     db.session.delete(lot)
@@ -282,13 +465,14 @@ def delete_lot(lot_id: int):
 
 @main_bp.route("/spots")
 def list_spots():
-    spots = ParkingSpot.query.order_by(ParkingSpot.SpotID.asc()).all()
-    lots = ParkingLot.query.all()
+    spots = ParkingSpot.query.order_by(ParkingSpot.SpotID.asc())
+    lots = ParkingLot.query
     return render_template("spots.html", spots=spots, lots=lots)
 
 @main_bp.route("/spots/new", methods=["GET", "POST"])
+@shard_routed(form_key="LotID")
 def new_spot():
-    lots = ParkingLot.query.all()
+    lots = _all_rows(lambda: ParkingLot.query.all())
     if request.method == "POST":
         number = request.form.get("SpotNumber")
         spot_type = request.form.get("SpotType")
@@ -303,19 +487,26 @@ def new_spot():
     return render_template("spot_form.html", lots=lots)
 
 @main_bp.route("/spots/<int:spot_id>/edit", methods=["GET", "POST"])
+@shard_routed(url_arg="spot_id")
 def edit_spot(spot_id: int):
     spot = ParkingSpot.query.get_or_404(spot_id)
     lots = ParkingLot.query.all()
     if request.method == "POST":
         spot.SpotNumber = request.form.get("SpotNumber") or spot.SpotNumber
         spot.SpotType = request.form.get("SpotType") or spot.SpotType
+        _require_current_shard(LotID=request.form.get("LotID", type=int))
+        old_lot_id = spot.LotID
         spot.LotID = request.form.get("LotID", type=int) or spot.LotID
         spot.IsOccupied = bool(request.form.get("IsOccupied"))
         db.session.commit()
+        if spot.LotID != old_lot_id:
+            # The maximum stay of a parked ticket can differ per lot
+            retrack_tickets("t.SpotID = :spot_id", {"spot_id": spot_id})
         return redirect(url_for("main.list_spots"))
     return render_template("spot_form.html", spot=spot, lots=lots)
 
 @main_bp.route("/spots/<int:spot_id>/delete", methods=["POST"])
+@shard_routed(url_arg="spot_id")
 def delete_spot(spot_id: int):
     spot = ParkingSpot.query.get_or_404(spot_id)
     db.session.delete(spot)
@@ -326,13 +517,14 @@ def delete_spot(spot_id: int):
 
 @main_bp.route("/rates")
 def list_rates():
-    rates = ParkingRate.query.order_by(ParkingRate.RateID.asc()).all()
-    lots = ParkingLot.query.all()
+    rates = ParkingRate.query.order_by(ParkingRate.RateID.asc())
+    lots = ParkingLot.query
     return render_template("rates.html", rates=rates, lots=lots)
 
 @main_bp.route("/rates/new", methods=["GET", "POST"])
+@shard_routed(form_key="LotID")
 def new_rate():
-    lots = ParkingLot.query.all()
+    lots = _all_rows(lambda: ParkingLot.query.all())
     if request.method == "POST":
         rate_per_hour = request.form.get("RatePerHour")
         veh_type = request.form.get("VehicleType")
@@ -348,6 +540,7 @@ def new_rate():
     return render_template("rate_form.html", lots=lots)
 
 @main_bp.route("/rates/<int:rate_id>/edit", methods=["GET", "POST"])
+@shard_routed(url_arg="rate_id")
 def edit_rate(rate_id: int):
     rate = ParkingRate.query.get_or_404(rate_id)
     lots = ParkingLot.query.all()
@@ -355,13 +548,18 @@ def edit_rate(rate_id: int):
         rate.RatePerHour = request.form.get("RatePerHour") or rate.RatePerHour
         rate.VehicleType = request.form.get("VehicleType") or rate.VehicleType
         rate.SpotType = request.form.get("SpotType") or rate.SpotType
+        _require_current_shard(LotID=request.form.get("LotID", type=int))
+        old_grace = rate.GracePerMinute
         rate.GracePerMinute = request.form.get("GracePerMinute", type=int) or rate.GracePerMinute
         rate.LotID = request.form.get("LotID", type=int)
         db.session.commit()
+        if rate.GracePerMinute != old_grace:
+            retrack_tickets("t.RateID = :rate_id", {"rate_id": rate_id})
         return redirect(url_for("main.list_rates"))
     return render_template("rate_form.html", rate=rate, lots=lots)
 
 @main_bp.route("/rates/<int:rate_id>/delete", methods=["POST"])
+@shard_routed(url_arg="rate_id")
 def delete_rate(rate_id: int):
     rate = ParkingRate.query.get_or_404(rate_id)
     db.session.delete(rate)
@@ -372,57 +570,135 @@ def delete_rate(rate_id: int):
 
 @main_bp.route("/payments")
 def list_payments():
-    payments = Payment.query.order_by(Payment.PaymentID.asc()).all()
-    tickets = ParkingTicket.query.all()
+    payments = Payment.query.order_by(Payment.PaymentID.asc())
+    tickets = ParkingTicket.query
     return render_template("payments.html", payments=payments, tickets=tickets)
 
 @main_bp.route("/payments/new", methods=["GET", "POST"])
+@shard_routed(form_key="TicketID")
 def new_payment():
-    tickets = ParkingTicket.query.all()
+    tickets = _all_rows(lambda: ParkingTicket.query.all())
+    staff = _all_rows(lambda: Staff.query.all())
     if request.method == "POST":
         amount = request.form.get("Amount")
         method = request.form.get("PaymentMethod")
         status = request.form.get("TransactionStatus")
         ticket_id = request.form.get("TicketID", type=int)
+        staff_id = request.form.get("StaffID", type=int)
         if not (amount and method and ticket_id):
             abort(400, "Amount, PaymentMethod, TicketID are required")
-        p = Payment(Amount=amount, PaymentMethod=method, TransactionStatus=status, TicketID=ticket_id)
+        _require_current_shard(StaffID=staff_id)
+        p = Payment(Amount=amount, PaymentMethod=method, TransactionStatus=status, TicketID=ticket_id, StaffID=staff_id)
         db.session.add(p)
         db.session.commit()
         return redirect(url_for("main.list_payments"))
-    return render_template("payment_form.html", tickets=tickets)
+    return render_template("payment_form.html", tickets=tickets, staff=staff)
 
 @main_bp.route("/payments/<int:payment_id>/edit", methods=["GET", "POST"])
+@shard_routed(url_arg="payment_id")
 def edit_payment(payment_id: int):
     payment = Payment.query.get_or_404(payment_id)
     tickets = ParkingTicket.query.all()
+    staff = Staff.query.all()
     if request.method == "POST":
+        _require_current_shard(TicketID=request.form.get("TicketID", type=int), StaffID=request.form.get("StaffID", type=int))
         payment.Amount = request.form.get("Amount") or payment.Amount
         payment.PaymentMethod = request.form.get("PaymentMethod") or payment.PaymentMethod
         payment.TransactionStatus = request.form.get("TransactionStatus") or payment.TransactionStatus
         payment.TicketID = request.form.get("TicketID", type=int) or payment.TicketID
+        payment.StaffID = request.form.get("StaffID", type=int)
         db.session.commit()
         return redirect(url_for("main.list_payments"))
-    return render_template("payment_form.html", payment=payment, tickets=tickets)
+    return render_template("payment_form.html", payment=payment, tickets=tickets, staff=staff)
 
 @main_bp.route("/payments/<int:payment_id>/delete", methods=["POST"])
+@shard_routed(url_arg="payment_id")
 def delete_payment(payment_id: int):
     payment = Payment.query.get_or_404(payment_id)
     db.session.delete(payment)
     db.session.commit()
     return redirect(url_for("main.list_payments"))
 
+# ---- Settlements ----
+
+def _settlement_rows(day):
+    """Stored settlement rows of one day on one database (one shard in sharded mode)."""
+    lots = (
+        db.session.query(Settlement, ParkingLot.LotName)
+        .outerjoin(ParkingLot, ParkingLot.LotID == Settlement.LotID)
+        .filter(Settlement.BusinessDate == day)
+        .order_by(Settlement.LotID)
+        .all()
+    )
+    lines = (
+        db.session.query(SettlementLine, Staff.FirstName, Staff.LastName)
+        .outerjoin(Staff, Staff.StaffID == SettlementLine.StaffID)
+        .filter(SettlementLine.BusinessDate == day)
+        .all()
+    )
+    return (
+        [dict(lotId=s.LotID, lotName=name, ticketsClosed=s.TicketsClosed, totalBilled=s.TotalBilled,
+              paidAgainstBilled=s.PaidAgainstBilled, outstanding=s.Outstanding, mismatchedTickets=s.MismatchedTickets,
+              totalCollected=s.TotalCollected, failedPayments=s.FailedPayments, pendingPayments=s.PendingPayments)
+         for s, name in lots],
+        [dict(lotId=l.LotID, method=l.PaymentMethod, staffId=l.StaffID,
+              staffName=" ".join(n for n in (first, last) if n) or None, count=l.PaymentCount, amount=l.Amount)
+         for l, first, last in lines],
+    )
+
+
+def _settlement_report(day):
+    """Finance report for one business day, built only from the precomputed settlement tables."""
+    parts = scatter(_settlement_rows, day)
+    lots = sorted((lot for lot_rows, _ in parts for lot in lot_rows), key=lambda l: (l["lotId"] is None, l["lotId"] or 0))
+    by_method, by_staff = {}, {}
+    for _, lines in parts:
+        for line in lines:
+            m = by_method.setdefault(line["method"], {"method": line["method"], "count": 0, "amount": 0})
+            m["count"] += line["count"]
+            m["amount"] += line["amount"]
+            st = by_staff.setdefault(line["staffId"], {"staffId": line["staffId"], "staffName": line["staffName"], "count": 0, "amount": 0})
+            st["count"] += line["count"]
+            st["amount"] += line["amount"]
+    totals = {key: sum(lot[key] for lot in lots)
+              for key in ("ticketsClosed", "totalBilled", "paidAgainstBilled", "outstanding", "mismatchedTickets", "totalCollected")}
+    return dict(
+        date=day.isoformat(),
+        settled=bool(lots),
+        lots=lots,
+        byMethod=sorted(by_method.values(), key=lambda m: m["method"]),
+        byStaff=sorted(by_staff.values(), key=lambda st: (st["staffId"] is None, st["staffId"] or 0)),
+        totals=totals,
+    )
+
+
+def _business_date_arg():
+    raw = request.args.get("date")
+    if not raw:
+        return date.today() - timedelta(days=1)
+    return datetime.strptime(raw, "%Y-%m-%d").date()
+
+
+@main_bp.route("/settlements")
+def list_settlements():
+    try:
+        day = _business_date_arg()
+    except ValueError:
+        abort(400, "date must be YYYY-MM-DD")
+    return render_template("settlements.html", report=_settlement_report(day))
+
 # ---- Staff CRUD ----
 
 @main_bp.route("/staff")
 def list_staff():
-    staff = Staff.query.order_by(Staff.StaffID.asc()).all()
-    lots = ParkingLot.query.all()
+    staff = Staff.query.order_by(Staff.StaffID.asc())
+    lots = ParkingLot.query
     return render_template("staff.html", staff=staff, lots=lots)
 
 @main_bp.route("/staff/new", methods=["GET", "POST"])
+@shard_routed(form_key="LotID")
 def new_staff():
-    lots = ParkingLot.query.all()
+    lots = _all_rows(lambda: ParkingLot.query.all())
     if request.method == "POST":
         first = request.form.get("FirstName")
         last = request.form.get("LastName")
@@ -439,6 +715,7 @@ def new_staff():
     return render_template("staff_form.html", lots=lots)
 
 @main_bp.route("/staff/<int:staff_id>/edit", methods=["GET", "POST"])
+@shard_routed(url_arg="staff_id")
 def edit_staff(staff_id: int):
     staff = Staff.query.get_or_404(staff_id)
     lots = ParkingLot.query.all()
@@ -448,12 +725,14 @@ def edit_staff(staff_id: int):
         staff.Username = request.form.get("Username") or staff.Username
         staff.PasswordHash = request.form.get("PasswordHash") or staff.PasswordHash
         staff.Role = request.form.get("Role") or staff.Role
+        _require_current_shard(LotID=request.form.get("LotID", type=int))
         staff.LotID = request.form.get("LotID", type=int)
         db.session.commit()
         return redirect(url_for("main.list_staff"))
     return render_template("staff_form.html", staff=staff, lots=lots)
 
 @main_bp.route("/staff/<int:staff_id>/delete", methods=["POST"])
+@shard_routed(url_arg="staff_id")
 def delete_staff(staff_id: int):
     staff = Staff.query.get_or_404(staff_id)
     db.session.delete(staff)
@@ -463,27 +742,32 @@ def delete_staff(staff_id: int):
 # --- JSON API ---
 
 @api_bp.route("/available-spots/<int:lot_id>")
+@shard_routed(url_arg="lot_id")
 def available_spots(lot_id: int):
-    # Call MySQL function fn_GetAvailableSpotsCount
-    result = db.session.execute(text("SELECT fn_GetAvailableSpotsCount(:lot_id) AS available"), {"lot_id": lot_id}).mappings().first()
-    available = result.get("available") if result else 0
+    # Stored function fn_GetAvailableSpotsCount
+    available = available_spots_count(lot_id, conn=db.session.connection())
     return jsonify({"lotId": lot_id, "available": int(available or 0)})
 
 
 @api_bp.route("/available-spots-list/<int:lot_id>")
+@shard_routed(url_arg="lot_id")
 def available_spots_list(lot_id: int):
     # Return list of unoccupied spots in a lot so frontend can populate a dropdown
     # For debugging: also return ALL spots so we can see what's in the lot
-    all_spots = ParkingSpot.query.filter_by(LotID=lot_id).order_by(ParkingSpot.SpotNumber.asc()).all()
-    available_spots = ParkingSpot.query.filter_by(LotID=lot_id, IsOccupied=False).order_by(ParkingSpot.SpotNumber.asc()).all()
-    
-    data = [ {"SpotID": s.SpotID, "SpotNumber": s.SpotNumber} for s in available_spots ]
-    
+    # One query over plain row tuples; no ORM objects are built
+    all_spots = db.session.execute(
+        db.select(ParkingSpot.SpotID, ParkingSpot.SpotNumber, ParkingSpot.IsOccupied)
+        .where(ParkingSpot.LotID == lot_id)
+        .order_by(ParkingSpot.SpotNumber.asc())
+    ).all()
+
+    data = [{"SpotID": spot_id, "SpotNumber": number} for spot_id, number, occupied in all_spots if not occupied]
+
     # Include debug info
     debug_info = {
         "totalSpots": len(all_spots),
-        "availableCount": len(available_spots),
-        "allSpots": [{"SpotID": s.SpotID, "SpotNumber": s.SpotNumber, "IsOccupied": s.IsOccupied} for s in all_spots]
+        "availableCount": len(data),
+        "allSpots": [{"SpotID": spot_id, "SpotNumber": number, "IsOccupied": occupied} for spot_id, number, occupied in all_spots]
     }
     
     return jsonify({
@@ -493,6 +777,7 @@ def available_spots_list(lot_id: int):
     })
 
 @api_bp.route("/swap-spot", methods=["POST"])
+@shard_routed(json_key="ticketId")
 def swap_spot():
     data = request.get_json(force=True)
     ticket_id = data.get("ticketId")
@@ -500,21 +785,28 @@ def swap_spot():
     if not ticket_id or not new_spot_number:
         abort(400, "ticketId and newSpotNumber are required")
     try:
-        db.session.execute(text("CALL sp_SwapParkingSpots(:tid, :spot)"), {"tid": ticket_id, "spot": new_spot_number})
+        swap_parking_spots(ticket_id, new_spot_number, conn=db.session.connection())
         db.session.commit()
+        track_ticket(int(ticket_id))
         return jsonify({"status": "ok"})
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": "error", "message": str(e)}), 400
 
 @api_bp.route("/process-exit", methods=["POST"])
+@shard_routed(json_key="ticketId")
 def process_exit():
     data = request.get_json(force=True)
     ticket_id = data.get("ticketId")
     amount = data.get("amountPaid")
     method = data.get("paymentMethod")  # 'Cash', 'Credit Card', 'UPI', 'AppWallet'
+    staff_id = data.get("staffId")  # optional: attendant who took the payment
     if not ticket_id or amount is None or not method:
         abort(400, "ticketId, amountPaid, paymentMethod are required")
+    # Checked up front: on MySQL the procedure commits the exit before the payment is attributed
+    # bool is an int subclass: true would otherwise be taken for StaffID 1
+    if staff_id is not None and (isinstance(staff_id, bool) or not (isinstance(staff_id, int) and Staff.query.get(staff_id))):
+        return jsonify({"status": "error", "message": "Staff member not found"}), 400
     
     # Validate payment amount matches the required fee
     ticket = ParkingTicket.query.get(ticket_id)
@@ -542,8 +834,9 @@ def process_exit():
         }), 400
     
     try:
-        db.session.execute(text("CALL sp_ProcessVehicleExit(:tid, :amt, :pm)"), {"tid": ticket_id, "amt": amount, "pm": method})
+        process_vehicle_exit(ticket_id, amount, method, staff_id=staff_id, conn=db.session.connection())
         db.session.commit()
+        _ticket_closed(int(ticket_id))
         # Refresh ticket and spot info
         ticket = ParkingTicket.query.get(ticket_id)
         return jsonify({
@@ -557,6 +850,7 @@ def process_exit():
 
 
 @api_bp.route('/estimate-exit/<int:ticket_id>')
+@shard_routed(url_arg="ticket_id")
 def estimate_exit(ticket_id: int):
     # Estimate fee for a ticket without updating DB (used to show total to user before payment)
     ticket = ParkingTicket.query.get(ticket_id)
@@ -595,16 +889,21 @@ def api_create_lot_default():
     capacity = data.get('Capacity')
     location = data.get('Location')
     levels = data.get('Levels', 1)
+    shard = data.get('Shard')  # sharded mode: bind key of the shard that will own the lot
     if not name or capacity is None:
         return jsonify({'status': 'error', 'message': 'LotName and Capacity are required'}), 400
+    if shard is not None and shard not in shard_keys():
+        return jsonify({'status': 'error', 'message': f'Unknown shard {shard}'}), 400
     try:
-        create_parking_lot_with_default_rates(name, int(capacity), location, int(levels))
+        with use_shard(shard):
+            create_parking_lot_with_default_rates(name, int(capacity), location, int(levels))
         return jsonify({'status': 'ok'})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
 
 @api_bp.route('/add-ticket', methods=['POST'])
+@shard_routed(json_key="SpotID")
 def api_add_ticket():
     data = request.get_json(force=True)
     license_plate = data.get('LicensePlate')
@@ -614,8 +913,10 @@ def api_add_ticket():
     if not (license_plate and spot_id and rate_id):
         return jsonify({'status': 'error', 'message': 'LicensePlate, SpotID and RateID are required'}), 400
     try:
-        add_new_ticket_and_occupy_spot(license_plate, int(spot_id), int(rate_id), entry_time)
-        return jsonify({'status': 'ok'})
+        ticket_id = add_new_ticket_and_occupy_spot(license_plate, int(spot_id), int(rate_id), entry_time)
+        if ticket_id:
+            _ticket_opened(ticket_id, license_plate)
+        return jsonify({'status': 'ok', 'ticketId': ticket_id})
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 400
 
@@ -623,13 +924,56 @@ def api_add_ticket():
 @api_bp.route('/driver-total-spent/<int:driver_id>')
 def api_driver_total_spent(driver_id: int):
     """Call fn_GetDriverTotalSpent function to get total spent by a driver"""
+    def shard_total():
+        return float(driver_total_spent(driver_id, conn=db.session.connection()) or 0)
+
     try:
-        result = db.session.execute(
-            text("SELECT fn_GetDriverTotalSpent(:driver_id) AS total_spent"), 
-            {"driver_id": driver_id}
-        ).mappings().first()
-        total = float(result.get("total_spent") or 0) if result else 0.0
+        # A driver's tickets can be spread over every shard
+        total = sum(scatter(shard_total))
         return jsonify({"status": "ok", "driverId": driver_id, "totalSpent": total})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
+
+
+
+@api_bp.route('/open-ticket-by-plate')
+def api_open_ticket_by_plate():
+    """Resolve a (possibly misread) plate from the exit camera to its open ticket(s)."""
+    plate = (request.args.get('plate') or '').strip()
+    if not plate:
+        return jsonify({'status': 'error', 'message': 'plate is required'}), 400
+    fuzzy = request.args.get('fuzzy', '1') not in ('0', 'false', 'no')
+    matches = find_open_tickets(plate, fuzzy=fuzzy)
+    if not matches:
+        return jsonify({'status': 'error', 'message': 'No open ticket for plate'}), 404
+    return jsonify({
+        'status': 'ok',
+        'plate': plate,
+        'matches': [{'ticketId': tid, 'licensePlate': p, 'distance': dist} for tid, p, dist in matches],
+    })
+
+
+@api_bp.route('/alerts')
+def api_alerts():
+    """Open tickets past their grace period ('grace_expired') or maximum stay ('overstay'),
+    and exited tickets with a balance still owed ('outstanding')."""
+    limit = request.args.get('limit', type=int)
+    kind = request.args.get('kind')
+    parts = []
+    if kind != 'outstanding':
+        parts.append(active_alerts(limit=limit, kind=kind))
+    if kind in (None, 'outstanding'):
+        parts.append(outstanding_alerts(limit=limit))
+    alerts = merge_alerts(parts, limit=limit)
+    return jsonify({'status': 'ok', 'count': len(alerts), 'alerts': alerts})
+
+
+@api_bp.route('/settlements')
+def api_settlements():
+    """Stored end-of-day settlement of ?date=YYYY-MM-DD (default yesterday); see `flask settle`."""
+    try:
+        day = _business_date_arg()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'date must be YYYY-MM-DD'}), 400
+    return jsonify(dict(status='ok', **_settlement_report(day)))
@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import text
+from . import db
+from .models import Settlement, SettlementLine
+from .sharding import all_engines
+
+# A payment or ticket belongs to the lot of its spot, or of its rate once the
+# spot has been deleted. Rows with neither are settled under LotID NULL.
+_LOT_JOINS = (
+    "LEFT JOIN ParkingSpot s ON s.SpotID = t.SpotID "
+    "LEFT JOIN ParkingRate r ON r.RateID = t.RateID "
+)
+_LOT = "COALESCE(s.LotID, r.LotID)"
+
+# Payments made during the business day (range on idx_payment_timestamp)
+_PAYMENTS_SQL = (
+    "SELECT " + _LOT + ", p.PaymentMethod, p.StaffID, p.TransactionStatus, p.Amount "
+    "FROM Payment p JOIN ParkingTicket t ON t.TicketID = p.TicketID " + _LOT_JOINS +
+    "WHERE p.PaymentTimestamp >= :start AND p.PaymentTimestamp < :end"
+)
+
+# Tickets closed during the business day with everything paid on them so far (range on idx_ticket_exit)
+_CLOSED_TICKETS_SQL = (
+    "SELECT " + _LOT + ", t.TicketID, t.TotalFee, "
+    "COALESCE(SUM(CASE WHEN p.TransactionStatus = 'Success' THEN p.Amount ELSE 0 END), 0) AS Paid "
+    "FROM ParkingTicket t " + _LOT_JOINS +
+    "LEFT JOIN Payment p ON p.TicketID = t.TicketID "
+    "WHERE t.ExitTime >= :start AND t.ExitTime < :end "
+    "GROUP BY " + _LOT + ", t.TicketID, t.TotalFee"
+)
+
+STREAM_BATCH = 1000
+
+
+def _money(value) -> Decimal:
+    # SQLite returns floats, MySQL Decimals
+    return Decimal(str(value or 0)).quantize(Decimal("0.01"))
+
+
+def _is_empty(summary) -> bool:
+    return not (summary["TicketsClosed"] or summary["TotalCollected"] or summary["FailedPayments"] or summary["PendingPayments"])
+
+
+def _stream(conn, sql: str, params: dict):
+    """Execute sql with a server-side cursor and yield its rows in batches."""
+    result = conn.execution_options(stream_results=True, yield_per=STREAM_BATCH).execute(text(sql), params)
+    yield from result
+
+
+def _new_summary(business_date: date, lot_id):
+    return {"BusinessDate": business_date, "LotID": lot_id, "TicketsClosed": 0,
+            "TotalBilled": Decimal(0), "PaidAgainstBilled": Decimal(0), "Outstanding": Decimal(0),
+            "MismatchedTickets": 0, "TotalCollected": Decimal(0), "FailedPayments": 0, "PendingPayments": 0}
+
+
+def _day_slices(business_date: date, parts: int):
+    """Split the business day into `parts` consecutive [start, end) time ranges."""
+    start = datetime.combine(business_date, time.min)
+    step = timedelta(days=1) / parts
+    bounds = [start + step * i for i in range(parts)] + [start + timedelta(days=1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def _aggregate(engine, business_date: date, start: datetime, end: datetime):
+    """Totals per lot of the payments made and tickets closed in [start, end).
+
+    Reads each range once through its timestamp index, streaming; memory
+    stays bounded by the number of (lot, method, staff) groups. Returns
+    ({LotID: summary}, {LotID: {(PaymentMethod, StaffID): [PaymentCount, Amount]}}).
+    """
+    params = {"start": start, "end": end}
+    summaries, lines = {}, {}
+    with engine.connect() as conn:
+        for lot_id, method, staff_id, status, amount in _stream(conn, _PAYMENTS_SQL, params):
+            summary = summaries.setdefault(lot_id, _new_summary(business_date, lot_id))
+            if status == "Failed":
+                summary["FailedPayments"] += 1
+            elif status == "Pending":
+                summary["PendingPayments"] += 1
+            elif status == "Success":
+                line = lines.setdefault(lot_id, {}).setdefault((method, staff_id), [0, Decimal(0)])
+                line[0] += 1
+                line[1] += _money(amount)
+                summary["TotalCollected"] += _money(amount)
+
+        for lot_id, _ticket_id, fee, paid in _stream(conn, _CLOSED_TICKETS_SQL, params):
+            summary = summaries.setdefault(lot_id, _new_summary(business_date, lot_id))
+            paid = _money(paid)
+            summary["TicketsClosed"] += 1
+            summary["PaidAgainstBilled"] += paid
+            if fee is None:
+                # trg_before_ticket_exit did not run: nothing billed, always a mismatch
+                summary["MismatchedTickets"] += 1
+                continue
+            fee = _money(fee)
+            summary["TotalBilled"] += fee
+            summary["Outstanding"] += max(fee - paid, Decimal(0))
+            if paid != fee:
+                summary["MismatchedTickets"] += 1
+    return summaries, lines
+
+
+def _store(engine, business_date: date, parts):
+    """Merge the _aggregate() results of one database and replace its stored rows for the day."""
+    with engine.connect() as conn:
+        lot_ids = conn.execute(text("SELECT LotID FROM ParkingLot ORDER BY LotID")).scalars().all()
+    summaries = {lot_id: _new_summary(business_date, lot_id) for lot_id in lot_ids + [None]}
+    lines = {}
+    for part_summaries, part_lines in parts:
+        for lot_id, part in part_summaries.items():
+            summary = summaries.setdefault(lot_id, _new_summary(business_date, lot_id))
+            for field, value in part.items():
+                if field not in ("BusinessDate", "LotID"):
+                    summary[field] += value
+        for lot_id, groups in part_lines.items():
+            for group, (count, amount) in groups.items():
+                line = lines.setdefault(lot_id, {}).setdefault(group, [0, Decimal(0)])
+                line[0] += count
+                line[1] += amount
+
+    results = []
+    for lot_id, summary in summaries.items():
+        line_rows = [{"BusinessDate": business_date, "LotID": lot_id, "PaymentMethod": method, "StaffID": staff_id,
+                      "PaymentCount": count, "Amount": amount}
+                     for (method, staff_id), (count, amount)
+                     in sorted(lines.get(lot_id, {}).items(), key=lambda i: (i[0][0], i[0][1] or 0))]
+        results.append((summary, line_rows))
+
+    # Re-running a day replaces its rows
+    settlements, settlement_lines = Settlement.__table__, SettlementLine.__table__
+    with engine.begin() as conn:
+        conn.execute(settlements.delete().where(settlements.c.BusinessDate == business_date))
+        conn.execute(settlement_lines.delete().where(settlement_lines.c.BusinessDate == business_date))
+        summary_rows = [summary for summary, _ in results if summary["LotID"] is not None or not _is_empty(summary)]
+        if summary_rows:
+            conn.execute(settlements.insert(), summary_rows)
+        line_rows = [line for _, lot_lines in results for line in lot_lines]
+        if line_rows:
+            conn.execute(settlement_lines.insert(), line_rows)
+    return results
+
+
+def _run(fn, items, workers: int):
+    if workers <= 1 or len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, items))
+
+
+def settle_database(engine, business_date: date, workers: int = 1):
+    """Compute the settlement of every lot of one database (shard) for a day and replace its stored rows.
+
+    With workers > 1 the day is split into that many time ranges, aggregated
+    in parallel on their own connections and merged. Returns
+    [(Settlement values, [SettlementLine values])], one item per lot.
+    """
+    slices = _day_slices(business_date, max(workers, 1))
+    parts = _run(lambda bounds: _aggregate(engine, business_date, *bounds), slices, workers)
+    return _store(engine, business_date, parts)
+
+
+def run_settlement(engines, business_date: date, workers: int = 4):
+    """Settle every lot of every engine (shard) for business_date; return the summaries by lot.
+
+    The day of each shard is split into time ranges so that `workers`
+    ranges are aggregated at once across all shards, even with a single
+    database; the work is dominated by waiting on the database. Each
+    range's payments and tickets are read once. Use workers <= 1 for an
+    in-memory SQLite database, whose single connection cannot be shared.
+    """
+    for engine in engines:
+        db.metadata.create_all(engine, tables=[Settlement.__table__, SettlementLine.__table__])
+    per_engine = max(workers // len(engines), 1)
+    tasks = [(engine, bounds) for engine in engines for bounds in _day_slices(business_date, per_engine)]
+    parts = _run(lambda task: _aggregate(task[0], business_date, *task[1]), tasks, workers)
+    results = _run(lambda i: _store(engines[i], business_date, parts[i * per_engine:(i + 1) * per_engine]),
+                   list(range(len(engines))), workers)
+    return [summary for shard in results for summary, _ in shard]
+
+
+@click.command("settle")
+@click.option("--date", "day", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Business day to settle (default: yesterday).")
+@click.option("--workers", default=4, show_default=True, help="Time ranges aggregated in parallel, across all shards (<= 1 runs sequentially).")
+@with_appcontext
+def settle_command(day, workers: int):
+    """Compute and store end-of-day settlements per lot, method and staff member."""
+    business_date = day.date() if day else date.today() - timedelta(days=1)
+    summaries = run_settlement(all_engines(), business_date, workers=workers)
+    for s in summaries:
+        if s["LotID"] is None and _is_empty(s):
+            continue
+        lot = f"Lot #{s['LotID']}" if s["LotID"] is not None else "No lot"
+        click.echo(f"{lot}: collected {s['TotalCollected']}, billed {s['TotalBilled']} on {s['TicketsClosed']} ticket(s), "
+                   f"outstanding {s['Outstanding']}, {s['MismatchedTickets']} mismatched")
+    click.echo(f"Settled {business_date} for {len(summaries)} lot group(s)")
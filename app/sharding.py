@@ -0,0 +1,161 @@
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import current_app, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import text
+
+# Lot-sharded deployment mode.
+#
+# DB_SHARDS lists one SQLAlchemy URI per shard; they become the binds
+# 'shard0'..'shardN-1' and shard0 is also the default bind. Each shard must
+# hand out interleaved AUTO_INCREMENT ids (auto_increment_increment = N,
+# auto_increment_offset = k + 1 on shard k) so any LotID, SpotID, TicketID,
+# RateID, PaymentID or StaffID identifies its shard as (id - 1) % N without
+# a lookup table. Staff live on the shard of their lot (shard0 without one).
+# Driver and Vehicle rows are reference data copied to every shard, so each
+# shard's foreign keys hold; they are written to shard0 first, then replicate().
+
+_current_shard = contextvars.ContextVar("current_shard", default=None)
+
+
+def shard_binds(uris) -> dict:
+    return {f"shard{i}": uri for i, uri in enumerate(uris)}
+
+
+class ShardRoutingSession(Session):
+    """Session that sends every statement to the shard selected with use_shard()."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            key = _current_shard.get()
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def shard_keys():
+    """Bind keys of all shards, or [] when sharding is off."""
+    return current_app.config.get("DB_SHARD_KEYS", [])
+
+
+def shard_key_for(record_id):
+    keys = shard_keys()
+    if not keys or record_id is None:
+        return None
+    return keys[(int(record_id) - 1) % len(keys)]
+
+
+@contextmanager
+def use_shard(key):
+    """Route db.session and shard_engine() to shard `key` (None = default bind)."""
+    token = _current_shard.set(key)
+    try:
+        yield
+    finally:
+        _current_shard.reset(token)
+
+
+def shard_engine():
+    """Engine of the shard selected by use_shard(), else the default engine."""
+    db = current_app.extensions["sqlalchemy"]
+    key = _current_shard.get()
+    return db.engines[key] if key is not None else db.engine
+
+
+def all_engines():
+    """One engine per shard; just the default engine when sharding is off."""
+    db = current_app.extensions["sqlalchemy"]
+    keys = shard_keys()
+    return [db.engines[k] for k in keys] if keys else [db.engine]
+
+
+def on_current_shard(record_id) -> bool:
+    """Whether record_id (e.g. a LotID a form moves a row to) belongs to the shard in use."""
+    keys = shard_keys()
+    if not keys or record_id is None:
+        return True
+    return shard_key_for(record_id) == (_current_shard.get() or keys[0])
+
+
+def shard_routed(url_arg: str = None, json_key: str = None, form_key: str = None):
+    """Run a view on the shard that owns the id in URL arg `url_arg`, JSON field `json_key`
+    or form field `form_key`. Without the id (e.g. a GET of a 'new' form) it runs on the default bind.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not shard_keys():
+                return view(*args, **kwargs)
+            if url_arg is not None:
+                record_id = kwargs.get(url_arg)
+            elif form_key is not None:
+                record_id = request.form.get(form_key) or None
+            else:
+                record_id = (request.get_json(force=True, silent=True) or {}).get(json_key)
+            try:
+                key = shard_key_for(record_id)
+            except (TypeError, ValueError):
+                # Let the view report the bad id
+                key = None
+            with use_shard(key):
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def scatter(fn, *args):
+    """Call fn(*args) on every shard in parallel and return the results in shard order.
+
+    Each call runs in its own thread, app context (hence its own db.session)
+    and shard. Without sharding fn runs once, inline.
+    """
+    keys = shard_keys()
+    if not keys:
+        return [fn(*args)]
+    app = current_app._get_current_object()
+
+    def run(key):
+        with app.app_context(), use_shard(key):
+            return fn(*args)
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+        return list(pool.map(run, keys))
+
+
+def scatter_rows(sql: str, params: dict = None):
+    """Run a read query on every shard and concatenate the rows."""
+    def query():
+        db = current_app.extensions["sqlalchemy"]
+        return db.session.execute(text(sql), params or {}).all()
+
+    return [row for rows in scatter(query) for row in rows]
+
+
+def gather(fn):
+    """Concatenate the lists fn() returns on every shard, e.g. all lots for a form's dropdown."""
+    return [item for items in scatter(fn) for item in items]
+
+
+def replicate(fn, *args):
+    """Repeat a reference-data write on every shard after the first.
+
+    fn(*args) runs on each remaining shard in its own app context and is
+    committed there; the caller has already committed the write on shard0.
+    The shards are not updated atomically: if one fails, the error is raised
+    and that shard stays behind until the write is repeated.
+    """
+    keys = shard_keys()[1:]
+    if not keys:
+        return
+    app = current_app._get_current_object()
+
+    def run(key):
+        db = app.extensions["sqlalchemy"]
+        with app.app_context(), use_shard(key):
+            fn(*args)
+            db.session.commit()
+
+    with ThreadPoolExecutor(max_workers=len(keys)) as pool:
+        list(pool.map(run, keys))
@@ -0,0 +1,484 @@
+import functools
+import math
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.schema import CreateColumn
+from . import db
+from .models import Payment
+from .sharding import all_engines
+
+# Embedded SQLite backend (DB_BACKEND=sqlite).
+#
+# The business rules in init_db.sql (and the two procedures that only exist in
+# project.sql) are MySQL routines. Here the triggers become SQLite triggers
+# whose MySQL arithmetic is done by Python functions registered on every
+# connection, and the functions/procedures are the Python functions below,
+# which db_helpers calls instead of SELECT fn_... / CALL sp_.... The schema
+# comes from app/models.py, whose foreign keys, enums and checks mirror
+# project.sql. `flask sqlite-parity` runs one scenario on both backends and
+# compares the results.
+
+_CENT = Decimal("0.01")
+
+
+class ProcedureError(Exception):
+    """Error raised by an emulated procedure, carrying MySQL's message."""
+
+
+def _decimal(value):
+    # A DECIMAL(10,2) value as MySQL would hold it; SQLite stores NUMERIC columns as REAL
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(_CENT, ROUND_HALF_UP)
+
+
+def _as_datetime(value):
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _mysql_datetime(value) -> str:
+    """Coerce a DATETIME parameter the way MySQL does (fractional seconds rounded away)."""
+    value = _as_datetime(value)
+    if value.microsecond >= 500000:
+        value += timedelta(seconds=1)
+    # Same text format SQLAlchemy's SQLite DateTime type writes and parses
+    return value.replace(microsecond=0).strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+# ---- Scalar functions used by the triggers and by app queries ----
+
+def ticket_fee(entry_time, exit_time, rate_per_hour):
+    """trg_before_ticket_exit: CEILING(TIMESTAMPDIFF(MINUTE, entry, exit) / 60.0) * RatePerHour."""
+    if entry_time is None or exit_time is None or rate_per_hour is None:
+        return None
+    delta = _as_datetime(exit_time) - _as_datetime(entry_time)
+    # TIMESTAMPDIFF counts whole minutes, truncating toward zero
+    minutes = abs(delta) // timedelta(minutes=1) * (1 if delta >= timedelta(0) else -1)
+    # minutes / 60.0 has 5 decimals and is then stored in v_DurationHours DECIMAL(10,2)
+    hours = (Decimal(minutes) / 60).quantize(Decimal("0.00001"), ROUND_HALF_UP).quantize(_CENT, ROUND_HALF_UP)
+    return float(math.ceil(hours) * _decimal(rate_per_hour))
+
+
+def paid_status(total_fee, total_paid, current):
+    """trg_after_payment_success: PaymentStatus of a ticket after a successful payment."""
+    fee, paid = _decimal(total_fee), _decimal(total_paid) or Decimal(0)
+    if fee is not None and paid >= fee:
+        return "Paid"
+    if paid > 0 and fee is not None and paid < fee:
+        return "Partial"
+    return current
+
+
+def _sql_functions():
+    # MySQL built-ins the dashboard queries use, plus the trigger helpers above
+    return {
+        "ticket_fee": (3, ticket_fee),
+        "paid_status": (3, paid_status),
+        "curdate": (0, lambda: date.today().isoformat()),
+        "month": (1, lambda value: _as_datetime(value).month if value is not None else None),
+        "year": (1, lambda value: _as_datetime(value).year if value is not None else None),
+    }
+
+
+# SQLite cannot assign NEW.TotalFee in a BEFORE trigger, so the fee trigger
+# updates the row after the fact; recursive triggers are off, so it does not
+# fire itself again. Names match init_db.sql.
+_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS trg_after_ticket_insert
+    AFTER INSERT ON ParkingTicket
+    FOR EACH ROW WHEN NEW.SpotID IS NOT NULL
+    BEGIN
+        UPDATE ParkingSpot SET IsOccupied = TRUE WHERE SpotID = NEW.SpotID;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_before_ticket_exit
+    AFTER UPDATE ON ParkingTicket
+    FOR EACH ROW WHEN NEW.ExitTime IS NOT NULL AND OLD.ExitTime IS NULL
+    BEGIN
+        UPDATE ParkingTicket
+        SET TotalFee = ticket_fee(OLD.EntryTime, NEW.ExitTime, (SELECT RatePerHour FROM ParkingRate WHERE RateID = NEW.RateID))
+        WHERE TicketID = NEW.TicketID;
+        UPDATE ParkingSpot SET IsOccupied = FALSE WHERE SpotID = NEW.SpotID;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_after_payment_success
+    AFTER INSERT ON Payment
+    FOR EACH ROW WHEN NEW.TransactionStatus = 'Success'
+    BEGIN
+        UPDATE ParkingTicket
+        SET PaymentStatus = paid_status(
+            TotalFee,
+            (SELECT SUM(Amount) FROM Payment WHERE TicketID = NEW.TicketID AND TransactionStatus = 'Success'),
+            PaymentStatus)
+        WHERE TicketID = NEW.TicketID;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_after_ticket_delete
+    AFTER DELETE ON ParkingTicket
+    FOR EACH ROW WHEN OLD.SpotID IS NOT NULL
+    BEGIN
+        UPDATE ParkingSpot SET IsOccupied = FALSE WHERE SpotID = OLD.SpotID;
+    END""",
+)
+
+
+@compiles(CreateColumn, "sqlite")
+def _local_timestamp_default(element, compiler, **kw):
+    # MySQL's CURRENT_TIMESTAMP is in the session (local) time zone, SQLite's in UTC
+    ddl = compiler.visit_create_column(element, **kw)
+    return ddl.replace("DEFAULT CURRENT_TIMESTAMP", "DEFAULT (datetime('now', 'localtime'))")
+
+
+def _on_connect(dbapi_conn, _record):
+    for name, (nargs, fn) in _sql_functions().items():
+        dbapi_conn.create_function(name, nargs, fn, deterministic=name != "curdate")
+    cur = dbapi_conn.cursor()
+    # InnoDB enforces the ON DELETE / ON UPDATE rules; SQLite only when asked to
+    cur.execute("PRAGMA foreign_keys = ON")
+    cur.close()
+
+
+def _set_shard_slot(slot, _dbapi_conn, record):
+    record.info["shard_slot"] = slot
+
+
+def is_sqlite(bind) -> bool:
+    return bind.dialect.name == "sqlite"
+
+
+def install(engine, shard_slot=None) -> None:
+    """Register the emulation on an SQLite engine; must run before its first connection.
+
+    shard_slot is (k, N) for shard k of N in sharded mode; see next_id().
+    """
+    event.listen(engine, "connect", _on_connect)
+    if shard_slot is not None:
+        event.listen(engine, "connect", functools.partial(_set_shard_slot, shard_slot))
+
+
+# Sharded mode routes by (id - 1) % N, which MySQL shards get from
+# auto_increment_increment/offset. SQLite has no equivalent, so rows of these
+# tables are inserted with an explicit id from next_id() on SQLite shards.
+# Driver ids are interleaved too: a driver is created on shard0 and copied to
+# the other shards under the same id. Settlement ids stay shard-local.
+_ROUTED_IDS = {
+    "ParkingLot": "LotID", "ParkingSpot": "SpotID", "ParkingTicket": "TicketID",
+    "ParkingRate": "RateID", "Payment": "PaymentID", "Staff": "StaffID", "Driver": "DriverID",
+}
+
+
+def next_id(conn, table: str):
+    """Primary key for a new row of table on an SQLite shard; None lets the database choose."""
+    slot = conn.info.get("shard_slot")
+    if slot is None or table not in _ROUTED_IDS:
+        return None
+    k, n = slot
+    last = conn.execute(text(f"SELECT COALESCE(MAX({_ROUTED_IDS[table]}), 0) FROM {table}")).scalar()
+    # The ORM assigns ids for a whole flush before inserting any of its rows
+    allocated = conn.info.setdefault("shard_last_ids", {})
+    last = max(last, allocated.get(table, 0))
+    allocated[table] = last + 1 + (k - last) % n
+    return allocated[table]
+
+
+def _assign_routed_id(mapper, connection, target):
+    pk = _ROUTED_IDS[mapper.local_table.name]
+    if getattr(target, pk) is None:
+        setattr(target, pk, next_id(connection, mapper.local_table.name))
+
+
+def create_schema(engine) -> None:
+    """Create missing tables and triggers; the equivalent of project.sql + init_db.sql."""
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        for ddl in _TRIGGERS:
+            conn.exec_driver_sql(ddl)
+
+
+def init_sqlite_backend(app) -> None:
+    from .models import Driver, ParkingLot, ParkingRate, ParkingSpot, ParkingTicket, Payment, Staff
+
+    keys = app.config["DB_SHARD_KEYS"]
+    with app.app_context():
+        engines = dict(zip(keys, all_engines())) if keys else {}
+        # The default engine is shard0's database opened through its own pool
+        engines[None] = db.engine
+        for key, engine in engines.items():
+            if not is_sqlite(engine):
+                continue
+            slot = None
+            if len(keys) > 1:
+                slot = (keys.index(key or keys[0]), len(keys))
+            install(engine, shard_slot=slot)
+            create_schema(engine)
+        for model in (ParkingLot, ParkingSpot, ParkingTicket, ParkingRate, Payment, Staff, Driver):
+            if not event.contains(model, "before_insert", _assign_routed_id):
+                event.listen(model, "before_insert", _assign_routed_id)
+
+
+# ---- Stored functions and procedures ----
+#
+# Each takes an SQLAlchemy connection. Procedures run in a savepoint: like
+# their EXIT HANDLER FOR SQLEXCEPTION, any error rolls their work back and
+# is re-raised as the procedure's SIGNAL message.
+
+def fn_GetAvailableSpotsCount(conn, lot_id) -> int:
+    return conn.execute(
+        text("SELECT COUNT(*) FROM ParkingSpot WHERE LotID = :lot AND IsOccupied = FALSE"), {"lot": lot_id}
+    ).scalar()
+
+
+def fn_GetDriverTotalSpent(conn, driver_id) -> Decimal:
+    total = conn.execute(
+        text(
+            "SELECT IFNULL(SUM(pt.TotalFee), 0) FROM ParkingTicket pt "
+            "WHERE pt.PaymentStatus = 'Paid' "
+            "AND pt.LicensePlate IN (SELECT v.LicensePlate FROM Vehicle v WHERE v.DriverID = :driver)"
+        ),
+        {"driver": driver_id},
+    ).scalar()
+    return _decimal(total)
+
+
+def _procedure(message: str):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(conn, *args):
+            try:
+                with conn.begin_nested():
+                    return fn(conn, *args)
+            except Exception as e:
+                raise ProcedureError(message) from e
+        return wrapper
+    return decorator
+
+
+@_procedure("Failed to create lot with default rates")
+def sp_CreateNewParkingLotWithDefaultRates(conn, lot_name, capacity, location, levels):
+    """Returns the new LotID."""
+    lot_id = conn.execute(
+        text("INSERT INTO ParkingLot (LotID, LotName, Capacity, Location, Levels) VALUES (:id, :name, :capacity, :location, :levels)"),
+        {"id": next_id(conn, "ParkingLot"), "name": lot_name, "capacity": capacity, "location": location, "levels": levels},
+    ).lastrowid
+    conn.execute(
+        text(
+            "INSERT INTO ParkingRate (RateID, RatePerHour, VehicleType, SpotType, LotID) VALUES "
+            "(:id0, 50.00, 'Car', 'Standard', :lot), (:id1, 30.00, 'Bike', 'Standard', :lot), (:id2, 20.00, 'Car', 'Compact', :lot)"
+        ),
+        {"lot": lot_id, **{f"id{i}": next_id(conn, "ParkingRate") for i in range(3)}},
+    )
+    return lot_id
+
+
+@_procedure("Failed to create ticket and occupy spot")
+def sp_AddNewTicketAndOccupySpot(conn, license_plate, spot_id, rate_id, entry_time):
+    """Returns the new TicketID."""
+    occupied = conn.execute(
+        text("SELECT COUNT(*) FROM ParkingSpot WHERE SpotID = :spot AND IsOccupied = TRUE"), {"spot": spot_id}
+    ).scalar()
+    if occupied > 0:
+        # Caught by the handler and re-signalled with its generic message, as in MySQL
+        raise ProcedureError("Target spot is already occupied")
+    ticket_id = conn.execute(
+        text(
+            "INSERT INTO ParkingTicket (TicketID, EntryTime, PaymentStatus, LicensePlate, SpotID, RateID) "
+            "VALUES (:id, :entry, 'Unpaid', :plate, :spot, :rate)"
+        ),
+        {"id": next_id(conn, "ParkingTicket"), "entry": _mysql_datetime(entry_time), "plate": license_plate,
+         "spot": spot_id, "rate": rate_id},
+    ).lastrowid
+    conn.execute(text("UPDATE ParkingSpot SET IsOccupied = TRUE WHERE SpotID = :spot"), {"spot": spot_id})
+    return ticket_id
+
+
+@_procedure("Spot swap failed. Transaction rolled back.")
+def sp_SwapParkingSpots(conn, ticket_id, new_spot_number):
+    # SELECT ... INTO that finds no row only raises a NOT FOUND warning in MySQL and
+    # leaves the variables NULL, so an unknown ticket or spot number is not an error
+    old = conn.execute(
+        text("SELECT SpotID, (SELECT LotID FROM ParkingSpot WHERE SpotID = pt.SpotID) FROM ParkingTicket pt WHERE TicketID = :ticket"),
+        {"ticket": ticket_id},
+    ).first()
+    old_spot_id, lot_id = old if old else (None, None)
+    new = conn.execute(
+        text("SELECT SpotID, IsOccupied FROM ParkingSpot WHERE SpotNumber = :number AND LotID = :lot"),
+        {"number": new_spot_number, "lot": lot_id},
+    ).all()
+    if len(new) > 1:
+        raise ProcedureError("Result consisted of more than one row")
+    new_spot_id, new_occupied = new[0] if new else (None, None)
+    if new_occupied:
+        raise ProcedureError("Cannot swap. The new spot is already occupied.")
+    conn.execute(text("UPDATE ParkingTicket SET SpotID = :spot WHERE TicketID = :ticket"), {"spot": new_spot_id, "ticket": ticket_id})
+    conn.execute(text("UPDATE ParkingSpot SET IsOccupied = TRUE WHERE SpotID = :spot"), {"spot": new_spot_id})
+    conn.execute(text("UPDATE ParkingSpot SET IsOccupied = FALSE WHERE SpotID = :spot"), {"spot": old_spot_id})
+
+
+def sp_ProcessVehicleExit(conn, ticket_id, amount_paid, payment_method):
+    """Returns the new PaymentID."""
+    # Arguments are converted to the ENUM / DECIMAL(10,2) parameters before the
+    # body and its handler run, so these errors keep MySQL's own messages
+    if payment_method not in Payment.__table__.c.PaymentMethod.type.enums:
+        raise ProcedureError("Data truncated for column 'p_PaymentMethod' at row 1")
+    try:
+        amount = _decimal(amount_paid)
+    except ArithmeticError:
+        raise ProcedureError(f"Incorrect decimal value: '{amount_paid}' for column 'p_AmountPaid' at row 1") from None
+    return _process_vehicle_exit(conn, ticket_id, amount, payment_method)
+
+
+@_procedure("Vehicle exit process failed. Transaction rolled back.")
+def _process_vehicle_exit(conn, ticket_id, amount, payment_method):
+    conn.execute(
+        text("UPDATE ParkingTicket SET ExitTime = :now WHERE TicketID = :ticket"),
+        {"now": _mysql_datetime(datetime.now()), "ticket": ticket_id},
+    )
+    return conn.execute(
+        text("INSERT INTO Payment (PaymentID, TicketID, Amount, PaymentMethod) VALUES (:id, :ticket, :amount, :method)"),
+        {"id": next_id(conn, "Payment"), "ticket": ticket_id, "amount": float(amount), "method": payment_method},
+    ).lastrowid
+
+
+# ---- Parity check against MySQL ----
+
+def _error_message(exc) -> str:
+    if isinstance(exc, DBAPIError) and getattr(exc.orig, "args", None):
+        # pymysql: (1644, 'message') for SIGNAL
+        return str(exc.orig.args[-1])
+    return str(exc)
+
+
+def parity_scenario(engine) -> dict:
+    """Run one entry/swap/exit/payment scenario through db_helpers on engine.
+
+    Every step commits on its own, like the procedures do. Results avoid
+    generated ids so runs on different databases are comparable. Rows are
+    tagged with a random suffix and removed at the end.
+    """
+    from . import db_helpers
+
+    tag = uuid.uuid4().hex[:8]
+    plate, lot_name = f"PAR-{tag}", f"Parity {tag}"
+    ids, results = {}, {}
+
+    def step(name, fn):
+        try:
+            with engine.begin() as conn:
+                results[name] = fn(conn)
+        except Exception as e:
+            results[name] = f"error: {_error_message(e)}"
+
+    def state(conn):
+        spots = conn.execute(text("SELECT SpotNumber, IsOccupied FROM ParkingSpot WHERE LotID = :lot ORDER BY SpotNumber"), {"lot": ids["lot"]}).all()
+        ticket = conn.execute(
+            text("SELECT s.SpotNumber, t.PaymentStatus, t.TotalFee, t.ExitTime IS NOT NULL "
+                 "FROM ParkingTicket t LEFT JOIN ParkingSpot s ON s.SpotID = t.SpotID WHERE t.TicketID = :ticket"),
+            {"ticket": ids.get("ticket")},
+        ).first()
+        return {
+            "spots": {number: bool(occupied) for number, occupied in spots},
+            "ticket": None if ticket is None else [ticket[0], ticket[1], str(_decimal(ticket[2])), bool(ticket[3])],
+        }
+
+    def setup(conn):
+        ids["lot"] = db_helpers.create_parking_lot_with_default_rates(lot_name, 2, "Parity check", 1, conn=conn)
+        for number in ("P1", "P2"):
+            conn.execute(text("INSERT INTO ParkingSpot (SpotNumber, SpotType, IsOccupied, LotID) VALUES (:n, 'Standard', FALSE, :lot)"),
+                         {"n": number, "lot": ids["lot"]})
+        conn.execute(text("INSERT INTO Driver (FirstName, PhoneNumber) VALUES ('Parity', :phone)"), {"phone": tag})
+        ids["driver"] = conn.execute(text("SELECT DriverID FROM Driver WHERE PhoneNumber = :phone"), {"phone": tag}).scalar()
+        conn.execute(text("INSERT INTO Vehicle (LicensePlate, VehicleType, DriverID) VALUES (:plate, 'Car', :driver)"),
+                     {"plate": plate, "driver": ids["driver"]})
+        ids["spots"] = dict(conn.execute(text("SELECT SpotNumber, SpotID FROM ParkingSpot WHERE LotID = :lot"), {"lot": ids["lot"]}).all())
+        rates = conn.execute(text("SELECT RateID, RatePerHour, VehicleType, SpotType FROM ParkingRate WHERE LotID = :lot"), {"lot": ids["lot"]}).all()
+        ids["rate"] = next(r[0] for r in rates if (r[2], r[3]) == ("Car", "Standard"))
+        return sorted([str(_decimal(r[1])), r[2], r[3]] for r in rates)
+
+    def enter(spot_number, key):
+        def run(conn):
+            entry = datetime.now() - timedelta(minutes=61)
+            ids[key] = db_helpers.add_new_ticket_and_occupy_spot(plate, ids["spots"][spot_number], ids["rate"], entry, conn=conn)
+            return state(conn)
+        return run
+
+    def swap(conn):
+        db_helpers.swap_parking_spots(ids["ticket"], "P2", conn=conn)
+        return state(conn)
+
+    def exit_(method):
+        def run(conn):
+            db_helpers.process_vehicle_exit(ids["ticket"], 50, method, conn=conn)
+            return state(conn)
+        return run
+
+    def pay(conn):
+        conn.execute(text("INSERT INTO Payment (TicketID, Amount, PaymentMethod, TransactionStatus) VALUES (:t, 50.00, 'Cash', 'Success')"),
+                     {"t": ids["ticket"]})
+        return state(conn)
+
+    def delete_second(conn):
+        conn.execute(text("DELETE FROM ParkingTicket WHERE TicketID = :t"), {"t": ids["second"]})
+        return state(conn)
+
+    try:
+        step("setup", setup)
+        if "rate" not in ids:
+            return results
+        step("available_before", lambda conn: db_helpers.available_spots_count(ids["lot"], conn=conn))
+        step("enter", enter("P1", "ticket"))
+        step("enter_occupied", enter("P1", "rejected"))
+        step("available_after_entry", lambda conn: db_helpers.available_spots_count(ids["lot"], conn=conn))
+        step("swap", swap)
+        step("swap_to_occupied", swap)
+        step("exit_bad_method", exit_("Cheque"))
+        step("exit", exit_("UPI"))
+        step("top_up", pay)
+        step("driver_total", lambda conn: str(db_helpers.driver_total_spent(ids["driver"], conn=conn)))
+        step("enter_again", enter("P1", "second"))
+        step("delete_ticket", delete_second)
+        return results
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text("DELETE FROM ParkingTicket WHERE LicensePlate = :plate"), {"plate": plate})
+            if "lot" in ids:
+                conn.execute(text("DELETE FROM ParkingSpot WHERE LotID = :lot"), {"lot": ids["lot"]})
+                conn.execute(text("DELETE FROM ParkingRate WHERE LotID = :lot"), {"lot": ids["lot"]})
+                conn.execute(text("DELETE FROM ParkingLot WHERE LotID = :lot"), {"lot": ids["lot"]})
+            conn.execute(text("DELETE FROM Vehicle WHERE LicensePlate = :plate"), {"plate": plate})
+            conn.execute(text("DELETE FROM Driver WHERE PhoneNumber = :phone"), {"phone": tag})
+
+
+def memory_engine():
+    """A fresh in-memory database with the schema and emulation installed."""
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    install(engine)
+    create_schema(engine)
+    return engine
+
+
+@click.command("sqlite-parity")
+@click.option("--mysql-uri", envvar="PARITY_MYSQL_URI", default=None,
+              help="Scratch MySQL database with project.sql and init_db.sql applied (default: the app database).")
+@with_appcontext
+def parity_command(mysql_uri):
+    """Check that the SQLite emulation of the triggers and routines matches MySQL."""
+    uri = mysql_uri or current_app.config["SQLALCHEMY_DATABASE_URI"]
+    if not uri.startswith("mysql"):
+        raise click.ClickException("A MySQL database is needed to compare against (--mysql-uri or PARITY_MYSQL_URI).")
+    expected = parity_scenario(create_engine(uri))
+    actual = parity_scenario(memory_engine())
+    differences = 0
+    for name in expected.keys() | actual.keys():
+        if expected.get(name) != actual.get(name):
+            differences += 1
+            click.echo(f"{name}: mysql={expected.get(name)!r} sqlite={actual.get(name)!r}")
+    if differences:
+        raise click.ClickException(f"{differences} step(s) differ")
+    click.echo(f"{len(expected)} step(s) match")
@@ -0,0 +1,33 @@
+"""Micro-benchmarks, run on the embedded SQLite backend: python -m benchmarks [name ...]."""
+import os
+import time
+
+
+def sqlite_app():
+    """create_app() on a fresh in-memory database, with an app context pushed."""
+    os.environ.update(DB_BACKEND="sqlite", SQLITE_PATH=":memory:", ASSETS_BUILD_ON_START="0")
+    os.environ.pop("DB_SHARDS", None)
+    from app import create_app
+
+    app = create_app()
+    app.app_context().push()
+    return app
+
+
+def measure(fn, repeat: int = 5, number: int = 1) -> float:
+    """Best-of-repeat seconds per call of fn."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def report(name: str, seconds: float, extra: str = "") -> None:
+    if seconds >= 1e-3:
+        value = f"{seconds * 1e3:9.2f} ms"
+    else:
+        value = f"{seconds * 1e6:9.1f} µs"
+    print(f"{name:<44}{value}  {extra}".rstrip())
@@ -0,0 +1,17 @@
+import importlib
+import pkgutil
+import sys
+import benchmarks
+
+
+def main(names):
+    available = sorted(m.name[len("bench_"):] for m in pkgutil.iter_modules(benchmarks.__path__) if m.name.startswith("bench_"))
+    for name in names or available:
+        if name not in available:
+            sys.exit(f"unknown benchmark {name!r}; choose from {', '.join(available)}")
+        print(f"== {name} ==")
+        importlib.import_module(f"benchmarks.bench_{name}").main()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,40 @@
+"""/api JSON encoding (orjson vs Flask's stdlib provider) and response compression."""
+import gzip
+from datetime import datetime, timedelta
+from decimal import Decimal
+from benchmarks import measure, report, sqlite_app
+
+ROWS = 2000
+
+
+def main():
+    from flask import jsonify
+    from flask.json.provider import DefaultJSONProvider
+    from app import json_response
+
+    app = sqlite_app()
+    start = datetime(2024, 1, 1, 8)
+    payload = {"status": "ok", "tickets": [
+        {"ticketId": i, "licensePlate": f"KA01AB{i:04d}", "entryTime": start + timedelta(minutes=i),
+         "totalFee": Decimal(i % 500) + Decimal("0.50"), "paymentStatus": "Partial"}
+        for i in range(ROWS)
+    ]}
+    stdlib = DefaultJSONProvider(app)
+    with app.test_request_context("/api/alerts"):
+        report(f"jsonify {ROWS} tickets, FastJSONProvider", measure(lambda: jsonify(payload), number=20),
+               "orjson" if json_response.orjson else "orjson not installed")
+        report(f"jsonify {ROWS} tickets, stdlib provider",
+               measure(lambda: stdlib.response(payload), number=20))
+        body = jsonify(payload).get_data()
+    report("gzip level 5", measure(lambda: gzip.compress(body, compresslevel=5), number=20),
+           f"{len(body)} -> {len(gzip.compress(body, compresslevel=5))} bytes")
+    if json_response.brotli is not None:
+        brotli = json_response.brotli
+        report("brotli quality 4", measure(lambda: brotli.compress(body, quality=4), number=20),
+               f"{len(body)} -> {len(brotli.compress(body, quality=4))} bytes")
+
+    client = app.test_client()
+    app.config["API_COMPRESS_MIN_SIZE"] = 0
+    for encoding in ("identity", "gzip", "br"):
+        report(f"GET /api/alerts, Accept-Encoding: {encoding}",
+               measure(lambda: client.get("/api/alerts", headers={"Accept-Encoding": encoding}), number=200))
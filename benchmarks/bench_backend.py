@@ -0,0 +1,45 @@
+"""Embedded SQLite backend: startup, schema and the emulated routines."""
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from benchmarks import measure, report, sqlite_app
+
+_STARTUP = (
+    "import os, time; t = time.perf_counter();"
+    "os.environ.update(DB_BACKEND='sqlite', SQLITE_PATH=':memory:', ASSETS_BUILD_ON_START='0');"
+    "from app import create_app; create_app(); print(time.perf_counter() - t)"
+)
+
+
+def main():
+    start = time.perf_counter()
+    inner = float(subprocess.run([sys.executable, "-c", _STARTUP], capture_output=True, text=True, check=True).stdout)
+    report("process start + create_app (wall)", time.perf_counter() - start)
+    report("imports + create_app (in process)", inner)
+
+    from app import db, db_helpers
+    from app.sqlite_backend import create_schema, memory_engine, parity_scenario
+
+    report("memory_engine() (schema + triggers)", measure(memory_engine))
+    engine = memory_engine()
+    report("parity_scenario (13 steps)", measure(lambda: parity_scenario(engine), repeat=3))
+
+    sqlite_app()
+    create_schema(db.engine)
+    with db.engine.begin() as conn:
+        lot_id = db_helpers.create_parking_lot_with_default_rates("Bench", 1, conn=conn)
+        conn.exec_driver_sql(f"INSERT INTO ParkingSpot (SpotNumber, SpotType, LotID) VALUES ('B1', 'Standard', {lot_id})")
+        conn.exec_driver_sql("INSERT INTO Vehicle (LicensePlate, VehicleType) VALUES ('BENCH1', 'Car')")
+        spot_id = conn.exec_driver_sql("SELECT SpotID FROM ParkingSpot").scalar()
+        rate_id = conn.exec_driver_sql("SELECT RateID FROM ParkingRate WHERE VehicleType = 'Car' AND SpotType = 'Standard'").scalar()
+    entry = datetime.now() - timedelta(minutes=61)
+
+    def cycle():
+        with db.engine.begin() as conn:
+            ticket_id = db_helpers.add_new_ticket_and_occupy_spot("BENCH1", spot_id, rate_id, entry, conn=conn)
+            db_helpers.process_vehicle_exit(ticket_id, 100, "UPI", conn=conn)
+
+    report("entry + exit (2 procedures, 3 triggers)", measure(cycle, number=200))
+    with db.engine.connect() as conn:
+        report("fn_GetAvailableSpotsCount", measure(lambda: db_helpers.available_spots_count(lot_id, conn=conn), number=1000))
@@ -0,0 +1,42 @@
+"""PlateIndex lookups against an index of open tickets, with and without the DB re-check."""
+import random
+import string
+from benchmarks import measure, report, sqlite_app
+
+OPEN_TICKETS = 20000
+
+
+def _plate(rng):
+    return "".join(rng.choice(string.ascii_uppercase) for _ in range(2)) + f"{rng.randrange(100):02d}" + \
+        "".join(rng.choice(string.ascii_uppercase) for _ in range(2)) + f"{rng.randrange(10000):04d}"
+
+
+def main():
+    from app.plate_index import PlateIndex
+
+    rng = random.Random(7)
+    rows = [(i, _plate(rng)) for i in range(1, OPEN_TICKETS + 1)]
+    index = PlateIndex()
+    report(f"load {OPEN_TICKETS} open tickets", measure(lambda: index.load(rows), repeat=3))
+    plate = rows[OPEN_TICKETS // 2][1]
+    misread = plate[:-1]  # dropped last character
+    report("lookup exact, fuzzy=False", measure(lambda: index.lookup(plate, fuzzy=False), number=10000))
+    report("lookup exact, fuzzy", measure(lambda: index.lookup(plate), number=10000))
+    report("lookup single-character misread", measure(lambda: index.lookup(misread), number=10000))
+
+    app = sqlite_app()
+    from app import db
+    from app.plate_index import find_open_tickets, get_plate_index
+    from sqlalchemy import text
+
+    with db.engine.begin() as conn:
+        conn.execute(text("INSERT INTO ParkingLot (LotName, Capacity) VALUES ('Bench', 1)"))
+        conn.execute(text("INSERT INTO ParkingSpot (SpotNumber, SpotType, LotID) VALUES ('B1', 'Standard', 1)"))
+        conn.execute(text("INSERT INTO ParkingRate (RatePerHour, VehicleType, SpotType, LotID) VALUES (50, 'Car', 'Standard', 1)"))
+        conn.execute(text("INSERT INTO Vehicle (LicensePlate, VehicleType) VALUES (:p, 'Car')"), [{"p": p} for _, p in rows])
+        conn.execute(text("INSERT INTO ParkingTicket (TicketID, EntryTime, LicensePlate, SpotID, RateID) "
+                          "VALUES (:t, '2024-01-01 10:00:00', :p, 1, 1)"), [{"t": t, "p": p} for t, p in rows])
+    get_plate_index().load(rows)
+    for verify in (True, False):
+        app.config["PLATE_INDEX_VERIFY"] = verify
+        report(f"find_open_tickets misread, verify={verify}", measure(lambda: find_open_tickets(misread), number=1000))
@@ -164,5 +164,90 @@ BEGIN
     COMMIT;
 END;
 
+-- STATEMENT_BOUNDARY
+-- Also defined in project.sql; repeated here so every database (each shard
+-- included) gets them from the initializer, which cannot run DELIMITER scripts.
+DROP PROCEDURE IF EXISTS sp_SwapParkingSpots;
+-- STATEMENT_BOUNDARY
+CREATE PROCEDURE sp_SwapParkingSpots(
+    IN p_TicketID INT,
+    IN p_NewSpotNumber VARCHAR(10)
+)
+BEGIN
+    DECLARE v_OldSpotID INT;
+    DECLARE v_NewSpotID INT;
+    DECLARE v_LotID INT;
+    DECLARE v_IsNewSpotOccupied BOOLEAN;
+
+    -- If any error occurs, automatically roll back the transaction
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Spot swap failed. Transaction rolled back.';
+    END;
+
+    -- Find the OLD spot's ID and its LotID from the ticket
+    SELECT SpotID, (SELECT LotID FROM ParkingSpot WHERE SpotID = pt.SpotID)
+    INTO v_OldSpotID, v_LotID
+    FROM ParkingTicket pt
+    WHERE TicketID = p_TicketID;
+    
+    -- Find the NEW spot's ID and check if it's already occupied
+    SELECT SpotID, IsOccupied
+    INTO v_NewSpotID, v_IsNewSpotOccupied
+    FROM ParkingSpot
+    WHERE SpotNumber = p_NewSpotNumber AND LotID = v_LotID;
+
+    -- Business Rule: Fail if the target spot is already taken
+    IF v_IsNewSpotOccupied = TRUE THEN
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Cannot swap. The new spot is already occupied.';
+    END IF;
+
+    -- Start the transaction
+    START TRANSACTION;
+
+    -- Step 1: Update the ticket to point to the new spot
+    UPDATE ParkingTicket SET SpotID = v_NewSpotID WHERE TicketID = p_TicketID;
+    -- Step 2: Mark the new spot as occupied
+    UPDATE ParkingSpot SET IsOccupied = TRUE WHERE SpotID = v_NewSpotID;
+    -- Step 3: Mark the old spot as free
+    UPDATE ParkingSpot SET IsOccupied = FALSE WHERE SpotID = v_OldSpotID;
+
+    -- If all steps succeeded, commit the changes
+    COMMIT;
+END;
+
+-- STATEMENT_BOUNDARY
+DROP PROCEDURE IF EXISTS sp_ProcessVehicleExit;
+-- STATEMENT_BOUNDARY
+CREATE PROCEDURE sp_ProcessVehicleExit(
+    IN p_TicketID INT,
+    IN p_AmountPaid DECIMAL(10, 2),
+    IN p_PaymentMethod ENUM('Cash', 'Credit Card', 'UPI', 'AppWallet')
+)
+BEGIN
+    -- If any error occurs, automatically roll back the transaction
+    DECLARE EXIT HANDLER FOR SQLEXCEPTION
+    BEGIN
+        ROLLBACK;
+        SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Vehicle exit process failed. Transaction rolled back.';
+    END;
+
+    -- Start the transaction
+    START TRANSACTION;
+
+    -- Step 1: Set the vehicle's exit time. This fires 'trg_OnVehicleExit_CalculateFee'
+    UPDATE ParkingTicket 
+    SET ExitTime = NOW() 
+    WHERE TicketID = p_TicketID;
+
+    -- Step 2: Record the payment. This fires 'trg_OnSuccessfulPayment_UpdateTicketStatus'
+    INSERT INTO Payment (TicketID, Amount, PaymentMethod) 
+    VALUES (p_TicketID, p_AmountPaid, p_PaymentMethod);
+
+    -- If both steps succeeded, commit the changes
+    COMMIT;
+END;
+
 -- STATEMENT_BOUNDARY
 -- End of file
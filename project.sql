@@ -100,6 +100,9 @@ CREATE TABLE ParkingTicket (
     LicensePlate VARCHAR(15),
     SpotID INT,
     RateID INT,
+    INDEX idx_ticket_plate_exit (LicensePlate, ExitTime),
+    INDEX idx_ticket_exit (ExitTime),
+    INDEX idx_ticket_status_exit (PaymentStatus, ExitTime),
     FOREIGN KEY (LicensePlate) REFERENCES Vehicle(LicensePlate)
         ON DELETE SET NULL  
         ON UPDATE CASCADE,
@@ -120,6 +123,7 @@ CREATE TABLE Payment (
     PaymentTimestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     TicketID INT NOT NULL,
     StaffID INT,
+    INDEX idx_payment_timestamp (PaymentTimestamp),
     FOREIGN KEY (TicketID) REFERENCES ParkingTicket(TicketID)
         ON DELETE CASCADE  
         ON UPDATE CASCADE,
@@ -128,6 +132,41 @@ CREATE TABLE Payment (
         ON UPDATE CASCADE
 );
 
+-- Table 9: Settlement (end-of-day totals per lot, written by `flask settle`)
+CREATE TABLE Settlement (
+    SettlementID INT PRIMARY KEY AUTO_INCREMENT,
+    BusinessDate DATE NOT NULL,
+    LotID INT,
+    TicketsClosed INT NOT NULL DEFAULT 0,
+    TotalBilled DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    PaidAgainstBilled DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    Outstanding DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    MismatchedTickets INT NOT NULL DEFAULT 0,
+    TotalCollected DECIMAL(12, 2) NOT NULL DEFAULT 0,
+    FailedPayments INT NOT NULL DEFAULT 0,
+    PendingPayments INT NOT NULL DEFAULT 0,
+    CreatedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_settlement_day_lot (BusinessDate, LotID)
+);
+
+-- Table 10: SettlementLine (successful payments per lot, day, method and staff member)
+CREATE TABLE SettlementLine (
+    LineID INT PRIMARY KEY AUTO_INCREMENT,
+    BusinessDate DATE NOT NULL,
+    LotID INT,
+    PaymentMethod ENUM('Cash', 'Credit Card', 'UPI', 'AppWallet') NOT NULL,
+    StaffID INT,
+    PaymentCount INT NOT NULL,
+    Amount DECIMAL(12, 2) NOT NULL,
+    INDEX idx_settlement_line_day_lot (BusinessDate, LotID)
+);
+
+-- Table 11: DataVersion (one counter per cached-fragment topic, shared by all app workers)
+CREATE TABLE DataVersion (
+    Topic VARCHAR(20) PRIMARY KEY,
+    Version BIGINT NOT NULL DEFAULT 0
+);
+
 
 
 /*
@@ -0,0 +1,41 @@
+import pytest
+from app import create_app, db
+from app.models import ParkingLot, ParkingRate, ParkingSpot, Staff, Vehicle
+
+
+@pytest.fixture
+def sqlite_path():
+    """Database for the app fixture; override with a file path where other connections must see the data."""
+    return ":memory:"
+
+
+@pytest.fixture
+def app(monkeypatch, sqlite_path):
+    """App on a fresh database of the embedded SQLite backend."""
+    monkeypatch.setenv("DB_BACKEND", "sqlite")
+    monkeypatch.setenv("SQLITE_PATH", sqlite_path)
+    monkeypatch.setenv("ASSETS_BUILD_ON_START", "0")
+    monkeypatch.delenv("DB_SHARDS", raising=False)
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def lot(app):
+    """One lot with spots A1-A3, a Car/Standard rate of 50/h, two vehicles and an attendant."""
+    lot = ParkingLot(LotName="Main", Capacity=3)
+    db.session.add(lot)
+    db.session.flush()
+    db.session.add_all([ParkingSpot(SpotNumber=n, SpotType="Standard", LotID=lot.LotID) for n in ("A1", "A2", "A3")])
+    db.session.add(ParkingRate(RatePerHour=50, VehicleType="Car", SpotType="Standard", LotID=lot.LotID))
+    db.session.add_all([Vehicle(LicensePlate="KA01AB1234", VehicleType="Car"), Vehicle(LicensePlate="MH12XY0001", VehicleType="Car")])
+    db.session.add(Staff(FirstName="Asha", Username="asha", PasswordHash="x", Role="Attendant", LotID=lot.LotID))
+    db.session.commit()
+    return lot
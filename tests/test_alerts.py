@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+from app.alerts import AlertEngine, parse_lot_max_stay
+
+# Deadlines after load time, so load() does not treat them as a backlog
+ENTRY = datetime.now().replace(microsecond=0) + timedelta(days=1)
+
+
+def _engine(*rows, **kwargs):
+    engine = AlertEngine(**kwargs)
+    engine.load(rows)
+    return engine
+
+
+def test_parse_lot_max_stay():
+    assert parse_lot_max_stay("2:4, 3:12.5") == {2: 4.0, 3: 12.5}
+    assert parse_lot_max_stay("") == {}
+
+
+def test_deadlines_fire_in_order():
+    engine = _engine((1, "KA01", ENTRY, 30, 1), max_stay_hours=2)
+    # Load-time backlog is not reported as new
+    assert engine.advance(now=ENTRY) == []
+    fired = engine.advance(now=ENTRY + timedelta(minutes=31))
+    assert [(a["ticketId"], a["kind"]) for a in fired] == [(1, "grace_expired")]
+    fired = engine.advance(now=ENTRY + timedelta(hours=3))
+    assert [a["kind"] for a in fired] == ["overstay"]
+
+
+def test_default_grace_and_lot_override():
+    engine = _engine((1, "KA01", ENTRY, None, 7), max_stay_hours=24, lot_max_stay_hours={7: 1})
+    fired = engine.advance(now=ENTRY + timedelta(hours=1))
+    assert {a["kind"]: a["since"] for a in fired} == {
+        "grace_expired": ENTRY + timedelta(minutes=15),
+        "overstay": ENTRY + timedelta(hours=1),
+    }
+
+
+def test_untrack_drops_pending_and_active_alerts():
+    engine = _engine((1, "KA01", ENTRY, 15, 1), (2, "KA02", ENTRY, 15, 1))
+    engine.advance(now=ENTRY + timedelta(minutes=20))
+    engine.untrack(1)
+    assert [a["ticketId"] for a in engine._active.values()] == [2]
+    assert [a["ticketId"] for a in engine.advance(now=ENTRY + timedelta(days=2))] == [2]
+
+
+def test_unchanged_reschedule_keeps_alerts():
+    engine = _engine((1, "KA01", ENTRY, 15, 1))
+    engine.advance(now=ENTRY + timedelta(minutes=20))
+    heap_size = len(engine._heap)
+    # e.g. a swap within the same lot
+    engine.track(1, "KA01", ENTRY, 15, 1)
+    assert len(engine._heap) == heap_size
+    assert engine.advance(now=ENTRY + timedelta(minutes=30)) == []
+    assert [a["kind"] for a in engine.active(kind="grace_expired")] == ["grace_expired"]
+
+
+def test_reschedule_on_new_grace_period():
+    engine = _engine((1, "KA01", ENTRY, 15, 1))
+    engine.track(1, "KA01", ENTRY, 60, 1)
+    assert engine.advance(now=ENTRY + timedelta(minutes=30)) == []
+    assert [a["since"] for a in engine.advance(now=ENTRY + timedelta(minutes=61))] == [ENTRY + timedelta(minutes=60)]
+
+
+def test_outstanding_alerts(client, lot):
+    entry = (datetime.now() - timedelta(minutes=61)).strftime("%Y-%m-%d %H:%M:%S")
+    ticket_id = client.post("/api/add-ticket", json={"LicensePlate": "KA01AB1234", "SpotID": 1, "RateID": 1,
+                                                     "EntryTime": entry}).json["ticketId"]
+    assert client.get("/api/alerts?kind=outstanding").json["count"] == 0
+    # Exit through the edit form: fee 100.00, nothing paid
+    client.post(f"/tickets/{ticket_id}/edit", data={"ExitTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    alerts = client.get("/api/alerts").json["alerts"]
+    assert [(a["ticketId"], a["kind"], a["balance"]) for a in alerts] == [(ticket_id, "outstanding", 100.0)]
+    assert "Owes ₹100.00" in client.get("/").get_data(as_text=True)
+
+
+def _enter(client, minutes_ago, spot_id=1, plate="KA01AB1234"):
+    entry = (datetime.now() - timedelta(minutes=minutes_ago)).strftime("%Y-%m-%d %H:%M:%S")
+    return client.post("/api/add-ticket", json={"LicensePlate": plate, "SpotID": spot_id, "RateID": 1,
+                                                "EntryTime": entry}).json["ticketId"]
+
+
+def _alerts(client, kind):
+    return [(a["ticketId"], a["kind"]) for a in client.get(f"/api/alerts?kind={kind}").json["alerts"]]
+
+
+def test_active_alerts_drop_tickets_closed_elsewhere(client, lot):
+    from app import db
+    from sqlalchemy import text
+
+    closed, kept = _enter(client, 30), _enter(client, 30, spot_id=2, plate="MH12XY0001")
+    assert _alerts(client, "grace_expired") == [(closed, "grace_expired"), (kept, "grace_expired")]
+    # Another worker (or plain SQL) closes the ticket; this process's engine never hears of it
+    db.session.execute(text("UPDATE ParkingTicket SET ExitTime = CURRENT_TIMESTAMP WHERE TicketID = :t"), {"t": closed})
+    db.session.commit()
+    assert client.get("/api/alerts?kind=grace_expired&limit=1").json["alerts"][0]["ticketId"] == kept
+    assert _alerts(client, "grace_expired") == [(kept, "grace_expired")]
+
+
+def test_rate_edit_reschedules_grace(client, lot):
+    ticket_id = _enter(client, 30)
+    assert _alerts(client, "grace_expired") == [(ticket_id, "grace_expired")]
+    client.post("/rates/1/edit", data={"GracePerMinute": 60, "LotID": lot.LotID})
+    assert _alerts(client, "grace_expired") == []
+
+
+def test_spot_edit_reschedules_max_stay(app, client, lot):
+    from app import db
+    from app.alerts import current_alert_engine
+    from app.models import ParkingLot
+
+    other = ParkingLot(LotName="Short stay", Capacity=1)
+    db.session.add(other)
+    db.session.commit()
+    current_alert_engine().lot_max_stay_hours[other.LotID] = 0.25
+    ticket_id = _enter(client, 30)
+    assert _alerts(client, "overstay") == []
+    client.post("/spots/1/edit", data={"LotID": other.LotID, "IsOccupied": "1"})
+    assert _alerts(client, "overstay") == [(ticket_id, "overstay")]
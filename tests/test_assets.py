@@ -0,0 +1,62 @@
+import gzip
+import shutil
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+from app import assets
+from app.assets import build_assets, minify_css, minify_js
+
+
+def test_minify_js_strips_comments_only():
+    out = minify_js("// header\nconst a = 1;  /* inline */ const b = 2;\n")
+    assert "header" not in out and "inline" not in out
+    assert "const a=1;" in out and "const b=2;" in out
+
+
+def test_minify_js_keeps_strings_templates_and_regexes():
+    src = 'const s = "a // b /* c */";\nconst t = `x  ${s}  y`;\nconst r = /ab+c\\/d/g.test(s);\n'
+    out = minify_js(src)
+    assert '"a // b /* c */"' in out
+    assert "`x  ${s}  y`" in out
+    assert "/ab+c\\/d/g.test(s)" in out
+
+
+def test_minify_js_keeps_division_and_newlines():
+    out = minify_js("x = y / 2 / z\nlet a = 1\n")
+    assert "y / 2 / z" in out
+    # Newlines survive so automatic semicolon insertion is unchanged
+    assert out.splitlines() == ["x=y / 2 / z", "let a=1"]
+
+
+def test_minify_css():
+    src = "/* c */ a > b { color : red ; margin: 0 auto; }\n.x:hover  .y { width: calc(100% - 2px); }"
+    assert minify_css(src) == "a>b{color :red;margin:0 auto}.x:hover .y{width:calc(100% - 2px)}"
+
+
+@pytest.fixture
+def static_app(tmp_path):
+    """Stand-in app whose static folder is a copy of app/static."""
+    shutil.copytree(Path(assets.__file__).parent / "static", tmp_path / "static")
+    return SimpleNamespace(static_folder=str(tmp_path / "static"))
+
+
+def test_build_assets_writes_bundles_and_variants(static_app):
+    manifest = build_assets(static_app)
+    static = Path(static_app.static_folder)
+    for path in manifest.values():
+        body = (static / path).read_bytes()
+        assert gzip.decompress((static / (path + ".gz")).read_bytes()) == body
+    # Only final names are left behind
+    assert not [p for p in (static / "dist").iterdir() if p.name.endswith(".tmp")]
+    assert build_assets(static_app) == manifest
+
+
+def test_failed_build_leaves_no_partial_bundle(static_app, monkeypatch):
+    def fail(data, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(assets.gzip, "compress", fail)
+    with pytest.raises(OSError):
+        build_assets(static_app)
+    # The bundle is written last, so a retry is not skipped as already built
+    assert [p.name for p in (Path(static_app.static_folder) / "dist").iterdir()] == []
@@ -0,0 +1,57 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import text
+from app import db
+from app.audit import expected_fee, expected_status
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    # run_audit opens its own engine (and worker processes) on the database
+    return str(tmp_path / "parking.db")
+
+
+def test_expected_fee_truncates_minutes_toward_zero():
+    assert expected_fee("2024-01-01 10:00:00", "2024-01-01 11:01:00", 50) == Decimal(100)
+    # -119.5 minutes: TIMESTAMPDIFF gives -119, so CEILING(-1.98) = -1
+    assert expected_fee("2024-01-01 12:00:30", "2024-01-01 10:01:00", 50) == Decimal(-50)
+
+
+def test_expected_status_follows_the_trigger():
+    assert expected_status(None, Decimal(10), 1) is None
+    # No successful payment: the trigger never ran, even for a zero fee
+    assert expected_status(Decimal(0), Decimal(0), 0) == "Unpaid"
+    assert expected_status(Decimal(0), Decimal(0), 1) == "Paid"
+    assert expected_status(Decimal(100), Decimal(40), 1) == "Partial"
+    assert expected_status(Decimal(100), Decimal(100), 2) == "Paid"
+
+
+def _plant_violations():
+    for plate, spot_id in (("KA01AB1234", 1), ("MH12XY0001", 2)):
+        db.session.execute(text("INSERT INTO ParkingTicket (EntryTime, LicensePlate, SpotID, RateID) "
+                                "VALUES ('2024-01-01 10:00:00', :plate, :spot, 1)"), {"plate": plate, "spot": spot_id})
+    db.session.execute(text("UPDATE ParkingTicket SET ExitTime = '2024-01-01 11:30:00' WHERE TicketID = 1"))
+    db.session.execute(text("UPDATE ParkingTicket SET ExitTime = '2024-01-01 10:30:00' WHERE TicketID = 2"))
+    db.session.execute(text("INSERT INTO Payment (Amount, PaymentMethod, TicketID) VALUES (50, 'Cash', 2)"))
+    # What edit_ticket, delete_payment and edit_spot can leave behind
+    db.session.execute(text("UPDATE ParkingTicket SET TotalFee = 1 WHERE TicketID = 1"))
+    db.session.execute(text("DELETE FROM Payment WHERE TicketID = 2"))
+    db.session.execute(text("UPDATE ParkingSpot SET IsOccupied = 1 WHERE SpotID = 3"))
+    db.session.commit()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_audit_repairs_planted_violations(app, lot, workers):
+    _plant_violations()
+    runner = app.test_cli_runner()
+    result = runner.invoke(args=["audit", "--workers", str(workers), "--chunk-size", "1", "--repair"])
+    assert result.exit_code == 0, result.output
+    assert sorted(result.output.splitlines()) == sorted([
+        "payment_status: ParkingTicket #2 is 'Paid', expected 'Unpaid'",
+        "spot_occupancy: ParkingSpot #3 is True, expected False",
+        "total_fee: ParkingTicket #1 is Decimal('1.00'), expected Decimal('100.00')",
+        "3 violation(s) found",
+        "3 row(s) repaired",
+    ])
+    result = runner.invoke(args=["audit", "--workers", str(workers)])
+    assert result.output.splitlines() == ["0 violation(s) found"]
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+import pytest
+from app import create_app
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    """A file database, so a second app instance (another worker) shares it."""
+    return str(tmp_path / "parking.db")
+
+
+def _now(**delta):
+    return (datetime.now() - timedelta(**delta)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _enter(client, spot_id=1, plate="KA01AB1234"):
+    return client.post("/api/add-ticket", json={"LicensePlate": plate, "SpotID": spot_id, "RateID": 1,
+                                                "EntryTime": _now(hours=1, minutes=1)}).json["ticketId"]
+
+
+def _exit(client, ticket_id):
+    client.post(f"/tickets/{ticket_id}/edit", data={"ExitTime": _now()})
+
+
+def _pay(client, ticket_id, amount="12.34"):
+    client.post("/payments/new", data={"Amount": amount, "PaymentMethod": "Cash", "TransactionStatus": "Success",
+                                       "TicketID": ticket_id, "StaffID": 1})
+
+
+# (fragment, page, setup, write, text the page shows only after the write)
+CASES = [
+    ("drivers-table", "/drivers", None,
+     lambda c, t: c.post("/drivers/new", data={"FirstName": "Zubin", "PhoneNumber": "9000000001"}), "Zubin"),
+    ("vehicles-table", "/vehicles", None,
+     lambda c, t: c.post("/vehicles/new", data={"LicensePlate": "DL3CAB0042", "VehicleType": "Car"}), "DL3CAB0042"),
+    ("lots-table", "/lots", None,
+     lambda c, t: c.post("/lots/new", data={"LotName": "Annexe", "Capacity": 4}), "Annexe"),
+    ("spots-table", "/spots", None,
+     lambda c, t: c.post("/spots/new", data={"SpotNumber": "B9", "SpotType": "Standard", "LotID": 1}), "B9"),
+    ("rates-table", "/rates", None,
+     lambda c, t: c.post("/rates/new", data={"RatePerHour": "77.50", "VehicleType": "Bike", "SpotType": "Standard",
+                                             "LotID": 1}), "77.50"),
+    ("staff-table", "/staff", None,
+     lambda c, t: c.post("/staff/new", data={"FirstName": "Ravi", "Username": "ravi", "PasswordHash": "x",
+                                             "Role": "Attendant", "LotID": 1}), "ravi"),
+    ("payments-table", "/payments", _enter, lambda c, t: _pay(c, t), "12.34"),
+    ("tickets-table", "/tickets", None, lambda c, t: _enter(c, plate="MH12XY0001"), "MH12XY0001"),
+    ("dashboard-counts", "/", None,
+     lambda c, t: c.post("/drivers/new", data={"FirstName": "Zubin", "PhoneNumber": "9000000001"}),
+     'mt-2 mb-1">1</h4>'),
+    ("dashboard-occupancy", "/", None, lambda c, t: _enter(c), "1 / 3 occupied"),
+    ("dashboard-recent", "/", None, lambda c, t: _enter(c, plate="MH12XY0001"), "MH12XY0001"),
+    ("dashboard-outstanding", "/", _enter, lambda c, t: _exit(c, t), "Owes ₹"),
+    ("dashboard-charts", "/", _enter, lambda c, t: _pay(c, t), "12.34"),
+    ("dashboard-chart-data", "/", _enter, lambda c, t: _pay(c, t), "12.34"),
+]
+
+
+@pytest.mark.parametrize("fragment, page, setup, write, text", CASES, ids=[case[0] for case in CASES])
+def test_write_invalidates_fragment(app, client, lot, fragment, page, setup, write, text):
+    ticket_id = setup(client) if setup else None
+    cache = app.extensions["fragment_cache"]
+    assert text not in client.get(page).get_data(as_text=True)
+    key = cache._entries[fragment][0]
+    write(client, ticket_id)
+    assert text in client.get(page).get_data(as_text=True)
+    assert cache._entries[fragment][0] != key
+
+
+def test_unchanged_page_is_served_from_cache(app, client, lot):
+    client.get("/drivers")
+    entry = app.extensions["fragment_cache"]._entries["drivers-table"]
+    client.get("/drivers")
+    assert app.extensions["fragment_cache"]._entries["drivers-table"] is entry
+
+
+def test_write_in_one_worker_invalidates_another(app, client, lot, sqlite_path):
+    other = create_app().test_client()
+    assert "Zubin" not in other.get("/drivers").get_data(as_text=True)
+    client.post("/drivers/new", data={"FirstName": "Zubin", "PhoneNumber": "9000000001"})
+    assert "Zubin" in other.get("/drivers").get_data(as_text=True)
+
+
+def test_ttl_zero_disables_cache(app, client, lot):
+    app.extensions["fragment_cache"].ttl = 0
+    client.get("/drivers")
+    client.post("/drivers/new", data={"FirstName": "Zubin", "PhoneNumber": "9000000001"})
+    assert "Zubin" in client.get("/drivers").get_data(as_text=True)
+    assert app.extensions["fragment_cache"]._entries == {}
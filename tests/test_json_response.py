@@ -0,0 +1,58 @@
+import gzip
+import json
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from flask import jsonify
+from app import json_response
+
+
+def _spots(client, lot, encoding=None):
+    headers = {"Accept-Encoding": encoding} if encoding else {}
+    return client.get(f"/api/available-spots-list/{lot.LotID}", headers=headers)
+
+
+def test_api_encoding(app):
+    with app.test_request_context("/api/alerts"):
+        body = json.loads(jsonify({"b": Decimal("12.50"), "a": datetime(2024, 1, 1, 10, 30)}).get_data())
+    assert body == {"b": 12.5, "a": "2024-01-01T10:30:00"}
+    assert list(body) == ["b", "a"]
+
+
+def test_encoding_outside_api_is_flask_default(app):
+    with app.test_request_context("/"):
+        body = json.loads(app.json.dumps({"b": 1, "a": datetime(2024, 1, 1, 10, 30)}))
+    assert body == {"a": "Mon, 01 Jan 2024 10:30:00 GMT", "b": 1}
+    assert list(body) == ["a", "b"]
+
+
+def test_small_responses_are_not_compressed(client, lot):
+    response = _spots(client, lot, "gzip")
+    assert "Content-Encoding" not in response.headers
+    assert "Accept-Encoding" in response.headers["Vary"]
+
+
+def test_gzip_above_minimum_size(app, client, lot):
+    app.config["API_COMPRESS_MIN_SIZE"] = 10
+    plain = _spots(client, lot).get_data()
+    assert "Content-Encoding" not in _spots(client, lot).headers
+    response = _spots(client, lot, "gzip, deflate")
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.get_data()) == plain
+
+
+@pytest.mark.skipif(json_response.brotli is None, reason="Brotli not installed")
+def test_brotli_preferred_when_installed(app, client, lot):
+    app.config["API_COMPRESS_MIN_SIZE"] = 10
+    plain = _spots(client, lot).get_data()
+    response = _spots(client, lot, "gzip, br")
+    assert response.headers["Content-Encoding"] == "br"
+    assert json_response.brotli.decompress(response.get_data()) == plain
+
+
+def test_gzip_when_brotli_missing(app, client, lot, monkeypatch):
+    monkeypatch.setattr(json_response, "brotli", None)
+    app.config["API_COMPRESS_MIN_SIZE"] = 10
+    assert _spots(client, lot, "br, gzip").headers["Content-Encoding"] == "gzip"
+    assert "Content-Encoding" not in _spots(client, lot, "br").headers
@@ -0,0 +1,111 @@
+import threading
+from app.plate_index import PlateIndex, canonical_plate
+
+
+def _index(*rows):
+    index = PlateIndex()
+    index.load(rows)
+    return index
+
+
+def test_canonical_plate_folds_separators_and_confusables():
+    assert canonical_plate("ka-01 mj 1234") == canonical_plate("KAO1MJI234")
+
+
+def test_lookup_exact_confusable_and_single_edit():
+    index = _index((1, "KA01MJ1234"), (2, "MH12XY0001"))
+    assert index.lookup("KA01MJ1234") == [(1, "KA01MJ1234", 0)]
+    assert index.lookup("KAO1MJ1234") == [(1, "KA01MJ1234", 0)]
+    assert index.lookup("KA01M1234") == [(1, "KA01MJ1234", 1)]
+    assert index.lookup("KA01MJJ1234") == [(1, "KA01MJ1234", 1)]
+    assert index.lookup("KAO1MJ1234", fuzzy=False) == []
+    assert index.lookup("DL3CAB0000") == []
+
+
+def test_exact_match_sorts_first():
+    index = _index((1, "KA01MJ1234"), (2, "KAO1MJ1234"))
+    assert [m[0] for m in index.lookup("KAO1MJ1234")] == [2, 1]
+
+
+def test_add_discard_and_rename():
+    index = _index((1, "KA01MJ1234"))
+    index.add(2, "MH12XY0001")
+    index.discard(1)
+    assert index.lookup("KA01MJ1234") == []
+    index.rename_plate("MH12XY0001", "MH12XY0002")
+    assert index.lookup("MH12XY0002", fuzzy=False) == [(2, "MH12XY0002", 0)]
+    index.rename_plate("MH12XY0002", None)
+    assert index.lookup("MH12XY0002") == []
+
+
+def test_events_during_load_are_replayed():
+    index = PlateIndex()
+    querying, release = threading.Event(), threading.Event()
+
+    def fetch_rows():
+        querying.set()
+        release.wait()
+        # Read before the events below happened
+        return [(1, "KA01MJ1234"), (2, "MH12XY0001")]
+
+    loader = threading.Thread(target=index.ensure_loaded, args=(fetch_rows,))
+    loader.start()
+    querying.wait()
+    index.add(3, "DL3CAB0001")
+    index.discard(2)
+    release.set()
+    loader.join()
+    assert index.loaded
+    assert index.lookup("DL3CAB0001", fuzzy=False) == [(3, "DL3CAB0001", 0)]
+    assert index.lookup("MH12XY0001", fuzzy=False) == []
+    assert index.lookup("KA01MJ1234", fuzzy=False) == [(1, "KA01MJ1234", 0)]
+
+
+def test_open_ticket_by_plate_checks_the_database(client, lot):
+    from app import db
+    from sqlalchemy import text
+
+    ticket_id = client.post("/api/add-ticket", json={"LicensePlate": "KA01AB1234", "SpotID": 1, "RateID": 1}).json["ticketId"]
+    assert client.get("/api/open-ticket-by-plate?plate=KA01A81234").json["matches"][0]["ticketId"] == ticket_id
+    # Written by another process: not in this process's index
+    db.session.execute(text("INSERT INTO ParkingTicket (EntryTime, LicensePlate, SpotID, RateID) "
+                            "VALUES ('2024-01-01 10:00:00', 'MH12XY0001', 2, 1)"))
+    db.session.execute(text("UPDATE ParkingTicket SET ExitTime = '2024-01-01 12:00:00' WHERE TicketID = :t"), {"t": ticket_id})
+    db.session.commit()
+    assert client.get("/api/open-ticket-by-plate?plate=MH12XY0001").json["matches"][0]["licensePlate"] == "MH12XY0001"
+    assert client.get("/api/open-ticket-by-plate?plate=KA01AB1234").status_code == 404
+
+
+def test_index_is_loaded_at_startup(app):
+    from app.plate_index import current_plate_index
+
+    assert current_plate_index().loaded
+
+
+def test_verify_off_trusts_the_index(app, client, lot):
+    from app import db
+    from sqlalchemy import text
+
+    app.config["PLATE_INDEX_VERIFY"] = False
+    ticket_id = client.post("/api/add-ticket", json={"LicensePlate": "KA01AB1234", "SpotID": 1, "RateID": 1}).json["ticketId"]
+    db.session.execute(text("UPDATE ParkingTicket SET ExitTime = '2024-01-01 12:00:00' WHERE TicketID = :t"), {"t": ticket_id})
+    db.session.commit()
+    assert client.get("/api/open-ticket-by-plate?plate=KA01AB1234").json["matches"][0]["ticketId"] == ticket_id
+
+
+def test_vehicle_rename_applies_after_commit(client, lot):
+    from app import db
+    from app.models import Vehicle
+    from app.plate_index import current_plate_index
+
+    ticket_id = client.post("/api/add-ticket", json={"LicensePlate": "KA01AB1234", "SpotID": 1, "RateID": 1}).json["ticketId"]
+    index = current_plate_index()
+    db.session.get(Vehicle, "KA01AB1234").LicensePlate = "KA01AB9999"
+    db.session.flush()
+    assert index.lookup("KA01AB1234", fuzzy=False) == [(ticket_id, "KA01AB1234", 0)]
+    db.session.rollback()
+    assert index.lookup("KA01AB1234", fuzzy=False) == [(ticket_id, "KA01AB1234", 0)]
+    db.session.get(Vehicle, "KA01AB1234").LicensePlate = "KA01AB9999"
+    db.session.commit()
+    assert index.lookup("KA01AB9999", fuzzy=False) == [(ticket_id, "KA01AB9999", 0)]
+    assert index.lookup("KA01AB1234", fuzzy=False) == []
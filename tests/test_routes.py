@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta
+from app import db
+from app.models import ParkingSpot, ParkingTicket
+
+
+def _enter(client, hours_ago=1):
+    entry = (datetime.now() - timedelta(hours=hours_ago, minutes=1)).strftime("%Y-%m-%d %H:%M:%S")
+    return client.post("/api/add-ticket", json={"LicensePlate": "KA01AB1234", "SpotID": 1, "RateID": 1,
+                                                "EntryTime": entry}).json["ticketId"]
+
+
+def test_process_exit_rejects_unknown_staff_before_exiting(client, lot):
+    ticket_id = _enter(client)
+    for staff_id in (99, True, "1"):
+        response = client.post("/api/process-exit", json={"ticketId": ticket_id, "amountPaid": 100,
+                                                          "paymentMethod": "UPI", "staffId": staff_id})
+        assert response.status_code == 400, staff_id
+    assert db.session.get(ParkingTicket, ticket_id).ExitTime is None
+    assert client.get("/api/open-ticket-by-plate?plate=KA01AB1234").status_code == 200
+
+
+def test_process_exit_closes_ticket(client, lot):
+    ticket_id = _enter(client)
+    response = client.post("/api/process-exit", json={"ticketId": ticket_id, "amountPaid": 100, "paymentMethod": "UPI"})
+    assert response.json["paymentStatus"] == "Paid"
+    assert not db.session.get(ParkingSpot, 1).IsOccupied
+    assert client.get("/api/open-ticket-by-plate?plate=KA01AB1234").status_code == 404
+
+
+def test_edit_ticket_parses_times(client, lot):
+    ticket_id = _enter(client)
+    response = client.post(f"/tickets/{ticket_id}/edit", data={"EntryTime": "2024-01-01 10:00:00",
+                                                                "ExitTime": "2024-01-01 11:30:00"})
+    assert response.status_code == 302
+    ticket = db.session.get(ParkingTicket, ticket_id)
+    assert (ticket.EntryTime, ticket.ExitTime) == (datetime(2024, 1, 1, 10), datetime(2024, 1, 1, 11, 30))
+    assert client.post(f"/tickets/{ticket_id}/edit", data={"ExitTime": "yesterday"}).status_code == 400
+
+
+def test_pages_render(client, lot):
+    _enter(client)
+    for url in ("/", "/tickets", "/payments", "/settlements", "/lots", "/spots"):
+        assert client.get(url).status_code == 200, url
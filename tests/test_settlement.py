@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import pytest
+from sqlalchemy import text
+from app import db
+from app.models import ParkingLot, ParkingRate, ParkingSpot, Settlement, SettlementLine
+from app.settlement import _day_slices, run_settlement, settle_database
+
+
+@pytest.fixture
+def sqlite_path(tmp_path):
+    """A file database: parallel workers each open their own connection."""
+    return str(tmp_path / "parking.db")
+
+
+def _ticket(client, plate, spot_id, rate_id, hours_ago):
+    entry = (datetime.now() - timedelta(hours=hours_ago, minutes=1)).strftime("%Y-%m-%d %H:%M:%S")
+    return client.post("/api/add-ticket", json={"LicensePlate": plate, "SpotID": spot_id, "RateID": rate_id,
+                                                "EntryTime": entry}).json["ticketId"]
+
+
+def test_settle_database_groups_by_lot(client, lot):
+    other = ParkingLot(LotName="Annex", Capacity=1)
+    db.session.add(other)
+    db.session.flush()
+    spot = ParkingSpot(SpotNumber="B1", SpotType="Standard", LotID=other.LotID)
+    rate = ParkingRate(RatePerHour=20, VehicleType="Car", SpotType="Standard", LotID=other.LotID)
+    db.session.add_all([spot, rate])
+    db.session.commit()
+
+    first = _ticket(client, "KA01AB1234", 1, 1, hours_ago=1)  # 2 started hours at 50
+    second = _ticket(client, "MH12XY0001", spot.SpotID, rate.RateID, hours_ago=0)  # 1 started hour at 20
+    assert client.post("/api/process-exit", json={"ticketId": first, "amountPaid": 100, "paymentMethod": "UPI",
+                                                  "staffId": 1}).json["status"] == "ok"
+    client.post(f"/tickets/{second}/edit", data={"ExitTime": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    db.session.execute(text("INSERT INTO Payment (TicketID, Amount, PaymentMethod, TransactionStatus) "
+                            "VALUES (:t, 5, 'Cash', 'Success'), (:t, 15, 'Cash', 'Failed')"), {"t": second})
+    db.session.commit()
+
+    results = settle_database(db.engine, date.today())
+    by_lot = {summary["LotID"]: (summary, lines) for summary, lines in results}
+    main, main_lines = by_lot[lot.LotID]
+    assert (main["TicketsClosed"], main["TotalBilled"], main["Outstanding"], main["MismatchedTickets"]) == (1, Decimal("100.00"), 0, 0)
+    assert [(line["PaymentMethod"], line["StaffID"], line["Amount"]) for line in main_lines] == [("UPI", 1, Decimal("100.00"))]
+    annex, annex_lines = by_lot[other.LotID]
+    assert (annex["TotalBilled"], annex["PaidAgainstBilled"], annex["Outstanding"]) == (Decimal("20.00"), Decimal("5.00"), Decimal("15.00"))
+    assert (annex["MismatchedTickets"], annex["FailedPayments"]) == (1, 1)
+    assert [(line["PaymentMethod"], line["PaymentCount"]) for line in annex_lines] == [("Cash", 1)]
+
+    # Re-running replaces the stored rows
+    run_settlement([db.engine], date.today(), workers=1)
+    assert Settlement.query.count() == 2
+    assert SettlementLine.query.count() == 2
+    report = client.get(f"/api/settlements?date={date.today().isoformat()}").json
+    assert report["totals"]["totalCollected"] == 105.0
+
+
+def test_day_slices_cover_the_day():
+    slices = _day_slices(date(2024, 5, 31), 7)
+    assert slices[0][0] == datetime(2024, 5, 31) and slices[-1][1] == datetime(2024, 6, 1)
+    assert all(a[1] == b[0] for a, b in zip(slices, slices[1:]))
+
+
+def test_workers_split_one_database_by_time(client, lot, sqlite_path):
+    day = date.today() - timedelta(days=1)
+    sql = text("INSERT INTO ParkingTicket (LicensePlate, SpotID, RateID, EntryTime, ExitTime, TotalFee) "
+               "VALUES ('KA01AB1234', 1, 1, :entry, :exit, 50)")
+    pay = text("INSERT INTO Payment (TicketID, Amount, PaymentMethod, TransactionStatus, PaymentTimestamp) "
+               "VALUES (:t, 50, 'Cash', :status, :at)")
+    for hour in (1, 7, 13, 23):
+        at = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+        ticket_id = db.session.execute(sql, {"entry": at - timedelta(minutes=30), "exit": at}).lastrowid
+        db.session.execute(pay, {"t": ticket_id, "status": "Success", "at": at})
+    # Neither collected nor counted as failed/pending
+    db.session.execute(pay, {"t": ticket_id, "status": None, "at": at})
+    db.session.commit()
+
+    sequential = run_settlement([db.engine], day, workers=1)
+    parallel = run_settlement([db.engine], day, workers=4)
+    assert parallel == sequential
+    main = next(s for s in parallel if s["LotID"] == lot.LotID)
+    assert (main["TicketsClosed"], main["TotalCollected"], main["MismatchedTickets"]) == (4, Decimal("200.00"), 0)
+    assert (main["FailedPayments"], main["PendingPayments"]) == (0, 0)
+    assert SettlementLine.query.filter_by(BusinessDate=day).one().PaymentCount == 4
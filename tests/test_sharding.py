@@ -0,0 +1,79 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app import create_app, db
+
+
+@pytest.fixture
+def app(monkeypatch, tmp_path):
+    """Two SQLite shards; shard0 gets odd ids and shard1 even ones."""
+    monkeypatch.setenv("DB_SHARDS", ",".join(f"sqlite:///{tmp_path / f's{i}.db'}" for i in range(2)))
+    monkeypatch.setenv("ASSETS_BUILD_ON_START", "0")
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        yield app
+
+
+def _rows(key, sql):
+    with db.engines[key].connect() as conn:
+        return [tuple(row) for row in conn.execute(text(sql))]
+
+
+@pytest.fixture
+def lots(client):
+    """Lot 1 (rates 1, 3, 5) on shard0, lot 2 (rates 2, 4, 6) on shard1, with one spot each."""
+    client.post("/lots/new", data={"LotName": "North", "Capacity": 5})
+    client.post("/lots/new", data={"LotName": "South", "Capacity": 5, "Shard": "shard1"})
+    for lot_id in (1, 2):
+        client.post("/spots/new", data={"SpotNumber": "S1", "SpotType": "Standard", "LotID": lot_id})
+    client.post("/vehicles/new", data={"LicensePlate": "KA01AB1234", "VehicleType": "Car"})
+
+
+def test_crud_forms_write_to_the_owning_shard(client, lots):
+    assert _rows("shard0", "SELECT LotID, LotName FROM ParkingLot") == [(1, "North")]
+    assert _rows("shard1", "SELECT LotID, LotName FROM ParkingLot") == [(2, "South")]
+    assert _rows("shard1", "SELECT RateID FROM ParkingRate ORDER BY RateID") == [(2,), (4,), (6,)]
+    assert _rows("shard1", "SELECT SpotID, LotID FROM ParkingSpot") == [(2, 2)]
+    client.post("/spots/2/edit", data={"SpotNumber": "S9", "LotID": 2})
+    assert _rows("shard1", "SELECT SpotNumber FROM ParkingSpot") == [("S9",)]
+    assert client.get("/lots/2/edit").status_code == 200
+    # Moving the spot to lot 1 would put it on the other shard
+    assert client.post("/spots/2/edit", data={"LotID": 1}).status_code == 400
+    client.post("/spots/2/delete")
+    assert _rows("shard1", "SELECT COUNT(*) FROM ParkingSpot") == [(0,)]
+    assert _rows("shard0", "SELECT COUNT(*) FROM ParkingSpot") == [(1,)]
+
+
+def test_reference_data_is_copied_to_every_shard(client):
+    client.post("/drivers/new", data={"FirstName": "Ravi", "PhoneNumber": "98450"})
+    client.post("/vehicles/new", data={"LicensePlate": "KA01AB1234", "VehicleType": "Car", "DriverID": 1})
+    client.post("/drivers/1/edit", data={"FirstName": "Ravi K", "PhoneNumber": "98450"})
+    for key in ("shard0", "shard1"):
+        assert _rows(key, "SELECT DriverID, FirstName FROM Driver") == [(1, "Ravi K")]
+        assert _rows(key, "SELECT LicensePlate, DriverID FROM Vehicle") == [("KA01AB1234", 1)]
+    client.post("/vehicles/KA01AB1234/delete")
+    assert _rows("shard1", "SELECT COUNT(*) FROM Vehicle") == [(0,)]
+
+
+def test_ticket_lifecycle_on_the_second_shard(client, lots):
+    client.post("/staff/new", data={"FirstName": "Asha", "Username": "asha", "PasswordHash": "x", "Role": "Attendant", "LotID": 2})
+    client.post("/staff/new", data={"FirstName": "Ben", "Username": "ben", "PasswordHash": "x", "Role": "Attendant", "LotID": 1})
+    assert _rows("shard1", "SELECT StaffID FROM Staff") == [(2,)]
+    entry = (datetime.now() - timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
+    client.post("/tickets/new", data={"LicensePlate": "KA01AB1234", "SpotID": 2, "RateID": 2, "EntryTime": entry})
+    assert _rows("shard1", "SELECT TicketID, SpotID FROM ParkingTicket") == [(2, 2)]
+    # Staff of the other shard's lot cannot take the payment
+    exit_ = {"ticketId": 2, "amountPaid": 50, "paymentMethod": "Cash"}
+    assert client.post("/api/process-exit", json=dict(exit_, staffId=1)).status_code == 400
+    assert client.post("/api/process-exit", json=dict(exit_, staffId=2)).json["paymentStatus"] == "Paid"
+    assert _rows("shard1", "SELECT PaymentID, StaffID FROM Payment") == [(2, 2)]
+    client.post("/tickets/2/delete")
+    assert _rows("shard1", "SELECT COUNT(*) FROM ParkingTicket") == [(0,)]
+
+
+def test_forms_list_rows_of_every_shard(client, lots):
+    page = client.get("/spots/new").get_data(as_text=True)
+    assert "North" in page and "South" in page
+    for url in ("/", "/tickets/new", "/rates/new", "/payments/new", "/staff/new", "/lots/new"):
+        assert client.get(url).status_code == 200, url
@@ -0,0 +1,68 @@
+import os
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+from app import db_helpers
+from app.sqlite_backend import ProcedureError, memory_engine, next_id, parity_scenario, ticket_fee
+
+# parity_scenario() results of MySQL with project.sql and init_db.sql applied
+EXPECTED = {
+    "setup": [["20.00", "Car", "Compact"], ["30.00", "Bike", "Standard"], ["50.00", "Car", "Standard"]],
+    "available_before": 2,
+    "enter": {"spots": {"P1": True, "P2": False}, "ticket": ["P1", "Unpaid", "None", False]},
+    "enter_occupied": "error: Failed to create ticket and occupy spot",
+    "available_after_entry": 1,
+    "swap": {"spots": {"P1": False, "P2": True}, "ticket": ["P2", "Unpaid", "None", False]},
+    "swap_to_occupied": "error: Spot swap failed. Transaction rolled back.",
+    "exit_bad_method": "error: Data truncated for column 'p_PaymentMethod' at row 1",
+    "exit": {"spots": {"P1": False, "P2": False}, "ticket": ["P2", "Partial", "100.00", True]},
+    "top_up": {"spots": {"P1": False, "P2": False}, "ticket": ["P2", "Paid", "100.00", True]},
+    "driver_total": "100.00",
+    "enter_again": {"spots": {"P1": True, "P2": False}, "ticket": ["P2", "Paid", "100.00", True]},
+    "delete_ticket": {"spots": {"P1": False, "P2": False}, "ticket": ["P2", "Paid", "100.00", True]},
+}
+
+
+def test_parity_scenario_on_sqlite():
+    engine = memory_engine()
+    assert parity_scenario(engine) == EXPECTED
+    with engine.connect() as conn:
+        # Scenario rows are cleaned up
+        assert conn.execute(text("SELECT COUNT(*) FROM ParkingTicket")).scalar() == 0
+        assert conn.execute(text("SELECT COUNT(*) FROM ParkingLot")).scalar() == 0
+
+
+@pytest.mark.skipif(not os.getenv("PARITY_MYSQL_URI"), reason="PARITY_MYSQL_URI not set")
+def test_parity_with_mysql():
+    assert parity_scenario(create_engine(os.environ["PARITY_MYSQL_URI"])) == parity_scenario(memory_engine())
+
+
+@pytest.mark.parametrize("minutes, fee", [(0, 0.0), (1, 50.0), (60, 50.0), (61, 100.0), (125, 150.0)])
+def test_ticket_fee_rounds_up_started_hours(minutes, fee):
+    assert ticket_fee("2024-01-01 10:00:00", f"2024-01-01 {10 + minutes // 60:02d}:{minutes % 60:02d}:00", 50) == fee
+
+
+def test_check_constraints_match_project_sql():
+    engine = memory_engine()
+    with engine.begin() as conn:
+        with pytest.raises(ProcedureError, match="Failed to create lot with default rates"):
+            db_helpers.create_parking_lot_with_default_rates("Empty", 0, conn=conn)
+        lot_id = db_helpers.create_parking_lot_with_default_rates("Small", 1, conn=conn)
+    for sql in ("INSERT INTO ParkingRate (RatePerHour, VehicleType, SpotType, LotID) VALUES (-1, 'Car', 'Standard', :lot)",
+                "INSERT INTO ParkingRate (RatePerHour, VehicleType, SpotType, LotID) VALUES (10, 'Boat', 'Standard', :lot)"):
+        with pytest.raises(IntegrityError), engine.begin() as conn:
+            conn.execute(text(sql), {"lot": lot_id})
+
+
+def test_next_id_interleaves_on_shards():
+    engine = memory_engine()
+    with engine.begin() as conn:
+        assert next_id(conn, "ParkingLot") is None
+        conn.info["shard_slot"] = (1, 3)
+        try:
+            ids = [db_helpers.create_parking_lot_with_default_rates(f"Lot {i}", 5, conn=conn) for i in range(3)]
+            rate_ids = conn.execute(text("SELECT RateID FROM ParkingRate ORDER BY RateID")).scalars().all()
+        finally:
+            del conn.info["shard_slot"]
+    assert ids == [2, 5, 8]
+    assert rate_ids == [2, 5, 8, 11, 14, 17, 20, 23, 26]